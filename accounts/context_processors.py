@@ -0,0 +1,6 @@
+from .roles import get_role
+
+
+def role(request):
+    """Права текущего пользователя в шаблонах: {% if role.can_manage %}"""
+    return {'role': get_role(request)}
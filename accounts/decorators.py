@@ -1,11 +1,12 @@
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect
 from functools import wraps
+from .roles import get_role
 
 def admin_required(function):
     @wraps(function)
     def wrap(request, *args, **kwargs):
-        if request.user.is_authenticated and request.user.userprofile.is_admin():
+        if get_role(request).is_admin:
             return function(request, *args, **kwargs)
         else:
             raise PermissionDenied
@@ -14,7 +15,7 @@ def admin_required(function):
 def manager_required(function):
     @wraps(function)
     def wrap(request, *args, **kwargs):
-        if request.user.is_authenticated and (request.user.userprofile.is_manager() or request.user.userprofile.is_admin()):
+        if get_role(request).can_manage:
             return function(request, *args, **kwargs)
         else:
             raise PermissionDenied
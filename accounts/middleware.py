@@ -0,0 +1,33 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from .roles import role_of
+
+
+class RoleMiddleware:
+    """Права пользователя по роли в request.role, вычисляются при первом
+    обращении и один раз на запрос. Ставится после AuthenticationMiddleware.
+    
+    Поддерживает и синхронную, и асинхронную цепочку, чтобы под ASGI
+    асинхронные представления не переводились в синхронный режим.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.set_role(request)
+        return self.get_response(request)
+    
+    async def __acall__(self, request):
+        self.set_role(request)
+        return await self.get_response(request)
+    
+    def set_role(self, request):
+        request.role = SimpleLazyObject(lambda: role_of(request.user))
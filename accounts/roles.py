@@ -0,0 +1,48 @@
+"""
+Роль пользователя и права по ней - один объект на запрос.
+
+RoleMiddleware кладет его в request.role, контекстный процессор
+accounts.context_processors.role - в шаблоны как role. Профиль пользователя
+сессии загружается вместе с ним (accounts.backends.ProfileModelBackend),
+поэтому роль не стоит отдельного запроса. В API пользователь определяется
+аутентификацией DRF, там права берутся через role_of(request.user).
+"""
+from .models import UserProfile
+
+ROLE_LABELS = dict(UserProfile.ROLE_CHOICES)
+
+
+class Role:
+    """Права по роли, которые проверяют декораторы, представления и шаблоны"""
+    
+    __slots__ = ('name', 'label', 'is_admin', 'is_manager', 'is_user', 'can_manage')
+    
+    def __init__(self, name=None):
+        self.name = name
+        self.label = ROLE_LABELS.get(name, '')
+        self.is_admin = name == 'admin'
+        self.is_manager = name == 'manager'
+        self.is_user = name == 'user'
+        # Управление проектами и задачами: менеджеры и администраторы
+        self.can_manage = self.is_admin or self.is_manager
+    
+    def __repr__(self):
+        return f'<Role: {self.name}>'
+
+
+# Анонимный пользователь или пользователь без профиля
+NO_ROLE = Role()
+
+
+def role_of(user):
+    """Права пользователя по роли из его профиля"""
+    if user is None or not user.is_authenticated:
+        return NO_ROLE
+    profile = getattr(user, 'userprofile', None)
+    return Role(profile.role) if profile is not None else NO_ROLE
+
+
+def get_role(request):
+    """Права текущего пользователя: из RoleMiddleware, если она подключена"""
+    role = getattr(request, 'role', None)
+    return role if role is not None else role_of(request.user)
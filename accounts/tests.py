@@ -1,7 +1,12 @@
-from django.test import TestCase, Client
-from django.contrib.auth.models import User
+from asgiref.sync import iscoroutinefunction
+from django.test import TestCase, Client, RequestFactory
+from django.contrib.auth.models import AnonymousUser, User
+from django.http import HttpResponse
 from django.urls import reverse
+from project_manager.query_budget import QueryBudgetTestMixin
 from .models import UserProfile
+from .middleware import RoleMiddleware
+from .roles import NO_ROLE, Role, role_of
 
 class UserAuthenticationTests(TestCase):
     def setUp(self):
@@ -68,4 +73,79 @@ class UserProfileTests(TestCase):
         user = User.objects.create_user(username='testuser', password='test123')
         profile = user.userprofile
         expected_str = f"{user.username} - {profile.get_role_display()}"
-        self.assertEqual(str(profile), expected_str)
\ No newline at end of file
+        self.assertEqual(str(profile), expected_str)
+
+class RoleTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123')
+        self.admin.userprofile.role = 'admin'
+        self.admin.userprofile.save()
+        self.user = User.objects.create_user(username='user', password='user123')
+    
+    def test_role_flags(self):
+        """Тест: флаги прав по роли"""
+        self.assertTrue(Role('admin').can_manage)
+        self.assertTrue(Role('manager').can_manage)
+        self.assertFalse(Role('manager').is_admin)
+        self.assertTrue(Role('user').is_user)
+        self.assertFalse(Role('user').can_manage)
+        self.assertEqual(Role('manager').label, 'Менеджер')
+        self.assertEqual(role_of(User.objects.get(pk=self.user.pk)).name, 'user')
+        self.assertIs(NO_ROLE, role_of(None))
+    
+    def test_profile_loaded_with_session_user(self):
+        """Тест: роль определяется без отдельного запроса профиля"""
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('profile'))
+        self.assertTrue(response.wsgi_request.role.is_admin)
+        self.assertTrue(response.context['role'].is_admin)
+        self.assertContains(response, 'Администратор')
+    
+    def test_session_with_old_backend_kept(self):
+        """Тест: сессия, созданная с ModelBackend, остается действительной"""
+        self.client.force_login(self.admin, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.wsgi_request.role.is_admin)
+    
+    def test_role_change_applies_to_next_request(self):
+        """Тест: смена роли действует со следующего запроса"""
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('user_management')).status_code, 403)
+        self.user.userprofile.role = 'admin'
+        self.user.userprofile.save()
+        self.assertEqual(self.client.get(reverse('user_management')).status_code, 200)
+    
+    async def test_middleware_keeps_async_chain(self):
+        """Тест: под ASGI RoleMiddleware остается асинхронной и задает request.role"""
+        async def get_response(request):
+            return HttpResponse(request.role.label)
+        
+        middleware = RoleMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        response = await middleware(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(request.role.can_manage)
+
+class AccountsQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='admin123')
+        self.admin.userprofile.role = 'admin'
+        self.admin.userprofile.save()
+        for i in range(5):
+            User.objects.create_user(username=f'user{i}', password='user123')
+    
+    def test_anonymous_pages_budget(self):
+        """Тест: страницы входа и регистрации укладываются в бюджет запросов"""
+        self.assertQueryBudget('login')
+        self.assertQueryBudget('register')
+    
+    def test_user_pages_budget(self):
+        """Тест: профиль и управление пользователями без N+1"""
+        self.client.force_login(self.admin)
+        self.assertQueryBudget('profile')
+        response = self.assertQueryBudget('user_management')
+        self.assertEqual(response.status_code, 200)
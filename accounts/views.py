@@ -3,6 +3,7 @@ from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User  # Добавляем этот импорт!
+from django.db.models import Count, Q
 from .forms import UserRegisterForm, UserUpdateForm, ProfileUpdateForm
 from .decorators import admin_required, manager_required
 
@@ -47,16 +48,17 @@ def user_management(request):
     # Получаем всех пользователей с их профилями
     users = User.objects.all().select_related('userprofile')
     
-    # Статистика
-    admin_count = users.filter(userprofile__role='admin').count()
-    manager_count = users.filter(userprofile__role='manager').count()
-    user_count = users.filter(userprofile__role='user').count()
+    # Статистика по ролям одним запросом
+    counts = User.objects.aggregate(
+        users_count=Count('id'),
+        admin_count=Count('id', filter=Q(userprofile__role='admin')),
+        manager_count=Count('id', filter=Q(userprofile__role='manager')),
+        user_count=Count('id', filter=Q(userprofile__role='user')),
+    )
     
     context = {
         'users': users,
-        'admin_count': admin_count,
-        'manager_count': manager_count,
-        'user_count': user_count,
+        **counts,
     }
     
     return render(request, 'accounts/user_management.html', context)
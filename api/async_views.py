@@ -0,0 +1,178 @@
+"""
+Асинхронные представления чтения API для запуска под ASGI.
+
+Используют async ORM (async for/afirst/acount) и не занимают поток на время
+запроса. Вывод совпадает с синхронными эндпоинтами (fast_representation),
+поддерживаются ?fields= и ?expand=. Аутентификация - по токену или по сессии.
+"""
+import base64
+import json
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from accounts.models import UserProfile
+from projects.models import Project, Task, Comment
+from .authentication import CachedTokenAuthentication
+from .serializers import ProjectSerializer, TaskSerializer, CommentSerializer, parse_field_spec
+
+_renderer = JSONRenderer()
+_token_authentication = CachedTokenAuthentication()
+
+
+class AuthenticationFailed(Exception):
+    pass
+
+
+def _json(data, status=200):
+    return HttpResponse(_renderer.render(data), status=status, content_type='application/json')
+
+
+async def authenticate(request):
+    """Пользователь по заголовку Authorization: Token ... или по сессии.
+
+    Токен проверяется той же CachedTokenAuthentication, что и в синхронном
+    API: с тем же кэшем, его сбросом и сообщениями об ошибках. Профиль
+    загружается сразу (из кэша токена или вместе с пользователем сессии),
+    чтобы проверки ролей не обращались к базе синхронно. Возвращает None,
+    если пользователь не аутентифицирован.
+    """
+    header = request.headers.get('Authorization', '').split()
+    if header and header[0].lower() == 'token':
+        if len(header) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+        try:
+            user, _ = await sync_to_async(_token_authentication.authenticate_credentials)(header[1])
+        except exceptions.AuthenticationFailed as exc:
+            raise AuthenticationFailed(str(exc.detail))
+    else:
+        user = await sync_to_async(get_user)(request)
+        if not user.is_authenticated:
+            return None
+    if not User.userprofile.is_cached(user):
+        profile = await UserProfile.objects.filter(user=user).afirst()
+        User.userprofile.related.set_cached_value(user, profile)
+    return user
+
+
+def async_api_view(view):
+    """GET-представление с проверкой аутентификации, как IsAuthenticated в DRF"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return _json({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        try:
+            user = await authenticate(request)
+        except AuthenticationFailed as exc:
+            return _json({'detail': str(exc)}, status=403)
+        if user is None:
+            return _json({'detail': 'Authentication credentials were not provided.'}, status=403)
+        return await view(request, user, *args, **kwargs)
+    return wrapper
+
+
+def _page_size(request):
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    try:
+        requested = int(request.GET.get('page_size', page_size))
+    except ValueError:
+        return page_size
+    return min(requested, settings.API_CURSOR_MAX_PAGE_SIZE) if requested > 0 else page_size
+
+
+def _field_spec(request):
+    return parse_field_spec(request.GET.get('fields'), request.GET.get('expand'))
+
+
+async def _keyset_list(request, queryset, serializer_class):
+    """Страница по (-created_at, -id) с курсором (created_at, id) без COUNT(*)"""
+    spec = _field_spec(request)
+    size = _page_size(request)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            created_at, pk = datetime.fromisoformat(position[0]), int(position[1])
+        except (ValueError, TypeError, IndexError):
+            return _json({'detail': 'Invalid cursor'}, status=404)
+        queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=pk)
+    queryset = serializer_class.values_queryset(
+        queryset.order_by('-created_at', '-id'), spec, columns=['created_at']
+    )[:size + 1]
+    rows = [row async for row in queryset]
+    next_url = None
+    if len(rows) > size:
+        rows = rows[:size]
+        position = json.dumps([rows[-1]['created_at'].isoformat(), rows[-1]['id']])
+        next_url = replace_query_param(
+            request.build_absolute_uri(), 'cursor', base64.urlsafe_b64encode(position.encode()).decode()
+        )
+    return _json({
+        'next': next_url,
+        'previous': None,
+        'results': await serializer_class.afast_representation(rows, spec),
+    })
+
+
+async def _detail(request, queryset, serializer_class, pk):
+    spec = _field_spec(request)
+    row = await serializer_class.values_queryset(queryset.filter(pk=pk), spec).afirst()
+    if row is None:
+        return _json({'detail': 'Not found.'}, status=404)
+    data = await serializer_class.afast_representation([row], spec)
+    return _json(data[0])
+
+
+@async_api_view
+async def task_list(request, user):
+    return await _keyset_list(request, Task.objects.visible_to(user), TaskSerializer)
+
+
+@async_api_view
+async def task_detail(request, user, pk):
+    return await _detail(request, Task.objects.visible_to(user), TaskSerializer, pk)
+
+
+@async_api_view
+async def project_list(request, user):
+    """Постраничный список проектов, как PageNumberPagination"""
+    spec = _field_spec(request)
+    size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 0
+    count = await Project.objects.acount()
+    if page < 1 or (page > 1 and (page - 1) * size >= count):
+        return _json({'detail': 'Invalid page.'}, status=404)
+    queryset = ProjectSerializer.values_queryset(Project.objects.order_by('pk'), spec)
+    rows = [row async for row in queryset[(page - 1) * size:page * size]]
+    url = request.build_absolute_uri()
+    previous_url = None
+    if page == 2:
+        previous_url = remove_query_param(url, 'page')
+    elif page > 2:
+        previous_url = replace_query_param(url, 'page', page - 1)
+    return _json({
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if page * size < count else None,
+        'previous': previous_url,
+        'results': await ProjectSerializer.afast_representation(rows, spec),
+    })
+
+
+@async_api_view
+async def project_detail(request, user, pk):
+    return await _detail(request, Project.objects.all(), ProjectSerializer, pk)
+
+
+@async_api_view
+async def comment_list(request, user):
+    return await _keyset_list(request, Comment.objects.all(), CommentSerializer)
@@ -0,0 +1,53 @@
+"""
+Аутентификация API по токену с кэшированием пользователя и его роли
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+CACHE_KEY_PREFIX = 'api.token:'
+
+
+def _cache():
+    return caches[settings.API_TOKEN_CACHE_ALIAS]
+
+
+def token_cache_key(key):
+    return CACHE_KEY_PREFIX + key
+
+
+def invalidate_tokens(keys):
+    """Удаляет из кэша записи для указанных ключей токенов"""
+    _cache().delete_many([token_cache_key(key) for key in keys])
+
+
+def invalidate_user_tokens(user_id):
+    """Удаляет из кэша записи всех токенов пользователя"""
+    invalidate_tokens(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запросов к базе на повторных обращениях.
+
+    Токен кэшируется вместе с пользователем и профилем (user.userprofile
+    уже загружен), поэтому проверки ролей тоже не идут в базу. Записи живут
+    не дольше API_TOKEN_CACHE_TIMEOUT и сбрасываются сигналами из api.models
+    при удалении токена, изменении пользователя или его профиля.
+    """
+    
+    def authenticate_credentials(self, key):
+        cache = _cache()
+        cache_key = token_cache_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            try:
+                token = self.get_model().objects.select_related('user__userprofile').get(key=key)
+            except self.get_model().DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+            cache.set(cache_key, token, settings.API_TOKEN_CACHE_TIMEOUT)
+        return (token.user, token)
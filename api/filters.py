@@ -0,0 +1,107 @@
+"""
+Фильтрация и сортировка списков API через параметры запроса
+"""
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def _multi_value(request, name):
+    """Значения параметра: ?status=a,b и ?status=a&status=b"""
+    values = []
+    for value in request.query_params.getlist(name):
+        values.extend(item for item in value.split(',') if item)
+    return values
+
+
+class TaskFilter(BaseFilterBackend):
+    """Фильтры списка задач; каждый опирается на индекс модели Task.
+    
+    ?status=todo,in_progress    - статус (несколько значений через запятую)
+    ?priority=high              - приоритет (несколько значений; task_priority_created_idx)
+    ?project=1,2                - проект
+    ?assigned_to=5|me|none      - исполнитель, текущий пользователь или без исполнителя
+    ?due_date_after=2024-01-01  - срок не раньше даты (включительно)
+    ?due_date_before=2024-12-31 - срок не позже даты (включительно)
+    ?overdue=true|false         - просроченные или непросроченные (частичный индекс task_overdue_idx)
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        model = queryset.model
+        errors = {}
+        filters = {}
+        
+        for name, choices in (('status', model.STATUS_CHOICES), ('priority', model.PRIORITY_CHOICES)):
+            values = _multi_value(request, name)
+            allowed = {value for value, label in choices}
+            if any(value not in allowed for value in values):
+                errors[name] = [f'Допустимые значения: {", ".join(sorted(allowed))}']
+            elif values:
+                filters[f'{name}__in'] = values
+        
+        projects = _multi_value(request, 'project')
+        if not all(value.isdigit() for value in projects):
+            errors['project'] = ['Ожидается id проекта']
+        elif projects:
+            filters['project__in'] = [int(value) for value in projects]
+        
+        assigned_to = request.query_params.get('assigned_to')
+        if assigned_to == 'me':
+            filters['assigned_to'] = request.user.pk
+        elif assigned_to == 'none':
+            filters['assigned_to__isnull'] = True
+        elif assigned_to is not None:
+            if assigned_to.isdigit():
+                filters['assigned_to'] = int(assigned_to)
+            else:
+                errors['assigned_to'] = ['Ожидается id пользователя, me или none']
+        
+        for name, lookup in (('due_date_after', 'due_date__gte'), ('due_date_before', 'due_date__lte')):
+            value = request.query_params.get(name)
+            if value is None:
+                continue
+            try:
+                parsed = parse_date(value)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                errors[name] = ['Ожидается дата в формате ГГГГ-ММ-ДД']
+            else:
+                filters[lookup] = parsed
+        
+        overdue = request.query_params.get('overdue')
+        if overdue is not None and overdue.lower() not in BOOLEAN_VALUES:
+            errors['overdue'] = ['Ожидается true или false']
+        
+        if errors:
+            raise ValidationError(errors)
+        queryset = queryset.filter(**filters)
+        if overdue is not None:
+            condition = model.overdue_q()
+            queryset = queryset.filter(condition) if BOOLEAN_VALUES[overdue.lower()] else queryset.exclude(condition)
+        return queryset
+
+
+class KeysetOrderingFilter(OrderingFilter):
+    """?ordering= для вьюсетов с keyset-пагинацией.
+    
+    К выбранному полю добавляется id в том же направлении, чтобы позиция
+    курсора была уникальной. Поля из ordering_columns сортируются по другой
+    колонке (например, приоритет - по индексированному рангу Task.priority_rank,
+    а не по алфавиту).
+    """
+    
+    def get_ordering(self, request, queryset, view):
+        columns = getattr(view, 'ordering_columns', {})
+        ordering = []
+        for term in super().get_ordering(request, queryset, view):
+            descending, field = term.startswith('-'), term.lstrip('-')
+            ordering.append(('-' if descending else '') + columns.get(field, field))
+        if ordering[-1].lstrip('-') != 'id':
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return tuple(ordering)
+    
+    def filter_queryset(self, request, queryset, view):
+        return queryset.order_by(*self.get_ordering(request, queryset, view))
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+
+class APIGZipMiddleware(GZipMiddleware):
+    """GZip для ответов API от API_GZIP_MIN_SIZE байт.
+    
+    Потоковые ответы (выгрузка задач) сжимаются по частям без буферизации.
+    HTML-страницы не сжимаются: в них есть CSRF-токен (атака BREACH).
+    """
+    
+    def process_response(self, request, response):
+        if not request.path_info.startswith(settings.API_GZIP_PATH_PREFIX):
+            return response
+        if not response.streaming and len(response.content) < settings.API_GZIP_MIN_SIZE:
+            return response
+        return super().process_response(request, response)
@@ -1,3 +1,21 @@
-from django.db import models
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from accounts.models import UserProfile
+from .authentication import invalidate_tokens, invalidate_user_tokens
 
-# Create your models here.
+# Сигналы для сброса кэша токенов (api.authentication)
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+@receiver(post_save, sender=User)
+def invalidate_user_token(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user_tokens(instance.pk)
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_profile_token(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user_tokens(instance.user_id)
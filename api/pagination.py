@@ -0,0 +1,125 @@
+import json
+from datetime import date
+
+from django.conf import settings
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Keyset-пагинация с непрозрачным курсором и без COUNT(*).
+    
+    Подключается во вьюсете через pagination_class; порядок сортировки
+    должен совпадать с индексом модели. В отличие от CursorPagination
+    позиция курсора - значения всех полей сортировки (последнее - id),
+    поэтому она уникальна и смещение не нужно, а сортировка по полям с
+    повторами и NULL (например, ?ordering=due_date) листается корректно.
+    NULL всегда идут в конце.
+    """
+    page_size_query_param = 'page_size'
+    
+    @property
+    def max_page_size(self):
+        return getattr(settings, 'API_CURSOR_MAX_PAGE_SIZE', 100)
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        current_position = None if self.cursor is None else self.cursor.position
+        
+        queryset = queryset.order_by(*self._order_by(queryset.model, reverse))
+        if current_position is not None:
+            queryset = queryset.filter(self._after(queryset.model, current_position, reverse))
+        
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following_position = len(results) > len(self.page)
+        following_position = None
+        if has_following_position:
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+        
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+    
+    def _nullable(self, model):
+        return {field.name for field in model._meta.concrete_fields if field.null}
+    
+    def _order_by(self, model, reverse):
+        nullable = self._nullable(model)
+        order_by = []
+        for term in self.ordering:
+            field = term.lstrip('-')
+            descending = term.startswith('-') != reverse
+            if field in nullable:
+                nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+            else:
+                nulls = {}
+            order_by.append(F(field).desc(**nulls) if descending else F(field).asc(**nulls))
+        return order_by
+    
+    def _after(self, model, position, reverse):
+        """Условие "строго после позиции" в порядке выдачи (до нее при reverse)"""
+        nullable = self._nullable(model)
+        try:
+            values = json.loads(position)
+        except ValueError:
+            values = None
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        
+        condition = Q(pk__in=[])
+        equal = Q()
+        for term, value in zip(self.ordering, values):
+            field = term.lstrip('-')
+            if value is None:
+                # NULL в конце: после них в этом поле ничего, до них - все не-NULL
+                step = Q(**{f'{field}__isnull': False}) if reverse else Q(pk__in=[])
+                same = Q(**{f'{field}__isnull': True})
+            else:
+                lookup = 'lt' if term.startswith('-') != reverse else 'gt'
+                step = Q(**{f'{field}__{lookup}': value})
+                if field in nullable and not reverse:
+                    step |= Q(**{f'{field}__isnull': True})
+                same = Q(**{field: value})
+            condition |= equal & step
+            equal &= same
+        return condition
+    
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for term in ordering:
+            field = term.lstrip('-')
+            value = instance[field] if isinstance(instance, dict) else getattr(instance, field)
+            values.append(value.isoformat() if isinstance(value, date) else value)
+        return json.dumps(values)
+
+
+class TaskCursorPagination(KeysetPagination):
+    # Индекс task_created_id_idx
+    ordering = ('-created_at', '-id')
+
+
+class CommentCursorPagination(KeysetPagination):
+    # Индекс comment_created_id_idx
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,44 @@
+"""
+MessagePack для API: рендерер и парсер.
+
+Зависимость msgpack необязательна: без нее классы импортируются, но
+project_manager.settings не подключает их в REST_FRAMEWORK.
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Ответ в MessagePack (Accept: application/msgpack или ?format=msgpack).
+    
+    Значения, которых нет в MessagePack (даты, Decimal, UUID, ленивые
+    строки), приводятся так же, как в JSONRenderer, поэтому данные после
+    декодирования совпадают с JSON-ответом.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    """Тело запроса в MessagePack (Content-Type: application/msgpack)"""
+    media_type = 'application/msgpack'
+    
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except (ValueError, TypeError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
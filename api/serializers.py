@@ -1,5 +1,8 @@
 from rest_framework import serializers
+from rest_framework.settings import ISO_8601, api_settings
 from django.contrib.auth.models import User
+from django.db.models import Count, Max, Prefetch
+from django.utils import timezone
 from accounts.models import UserProfile
 from projects.models import Project, Task, Comment
 
@@ -17,34 +20,357 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'profile']
 
-class CommentSerializer(serializers.ModelSerializer):
+# Ключ дерева полей: все поля узла (?expand= без ?fields=)
+ALL_FIELDS = '*'
+
+def parse_field_spec(fields=None, expand=None):
+    """Разбирает ?fields=id,tasks.title и ?expand=tasks.comments в дерево полей.
+    
+    Узел дерева - словарь {поле: поддерево}, где None означает "поле целиком",
+    а ключ ALL_FIELDS - все поля узла, кроме перечисленных отдельно. ?expand=
+    разбирается и без ?fields=: корень и промежуточные узлы пути тогда
+    выводятся целиком. Без обоих параметров возвращается None, т.е. все поля
+    (поведение по умолчанию).
+    """
+    if not fields and not expand:
+        return None
+    spec = {} if fields else {ALL_FIELDS: None}
+    for paths, default in ((fields, {}), (expand, {ALL_FIELDS: None})):
+        for path in (paths or '').split(','):
+            parts = [part for part in path.strip().split('.') if part]
+            node = spec
+            for part in parts[:-1]:
+                child = node.get(part, dict(default))
+                if child is None:
+                    # Поле уже запрошено целиком
+                    break
+                node[part] = child
+                node = child
+            else:
+                if parts:
+                    node[parts[-1]] = None
+    return spec
+
+def field_requested(spec, name):
+    """Нужно ли поле name в узле дерева полей spec"""
+    return spec is None or name in spec or ALL_FIELDS in spec
+
+def nested_spec(spec, name):
+    """Поддерево поля name; None - поле целиком"""
+    return None if spec is None else spec.get(name)
+
+def _fast_formatter(field):
+    """Быстрая замена field.to_representation для значения из values().
+    
+    None - значение выводится как есть (строки, числа, id связей, аннотации).
+    """
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if output_format and output_format.lower() == ISO_8601 and not hasattr(field, 'timezone'):
+            current = timezone.get_current_timezone()
+            
+            def format_datetime(value):
+                # Как DateTimeField.to_representation для ISO 8601
+                value = value.astimezone(current).isoformat()
+                if value.endswith('+00:00'):
+                    value = value[:-6] + 'Z'
+                return value
+            return format_datetime
+        return field.to_representation
+    if isinstance(field, serializers.DateField):
+        output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+        if output_format and output_format.lower() == ISO_8601:
+            return lambda value: value.isoformat()
+        return field.to_representation
+    if isinstance(field, (
+        serializers.CharField, serializers.ChoiceField, serializers.IntegerField,
+        serializers.RelatedField, serializers.SerializerMethodField, serializers.ReadOnlyField
+    )):
+        return None
+    return field.to_representation
+
+class SparseFieldsMixin:
+    """Выборочные поля (?fields=, ?expand=) для сериализатора и его queryset'а.
+    
+    Дерево полей приходит из context['field_spec'] и применяется к корневому
+    сериализатору, который передает поддеревья вложенным.
+    """
+    # Поле сериализатора -> (FK, поле связанной модели) для select_related
+    select_related_fields = {}
+    # Поле сериализатора -> (related_name, вложенный сериализатор, FK на родителя)
+    prefetch_fields = {}
+    # Поле сериализатора -> выражение аннотации или функция, которая его
+    # строит (для выражений, зависящих от текущей даты)
+    annotated_fields = {}
+    # Поле-аннотация -> функция(prefix), возвращающая агрегат для ETag:
+    # аннотация может меняться без изменения updated_at
+    annotated_validators = {}
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        spec = self.context.get('field_spec')
+        if spec is not None:
+            self.restrict_fields(spec)
+    
+    def restrict_fields(self, spec):
+        for name in list(self.fields):
+            if not field_requested(spec, name):
+                self.fields.pop(name)
+            elif nested_spec(spec, name) is not None:
+                nested = getattr(self.fields[name], 'child', self.fields[name])
+                if isinstance(nested, SparseFieldsMixin):
+                    nested.restrict_fields(nested_spec(spec, name))
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset, spec=None, parent_fk=None, columns=()):
+        """План загрузки, соответствующий запрошенным полям сериализатора.
+        
+        Незапрошенные вложенные связи не загружаются, незапрошенные колонки
+        откладываются через only(). parent_fk - FK на родителя при загрузке через
+        Prefetch: родитель уже в кэше, JOIN на него не нужен. columns - колонки,
+        которые нужны вызывающему коду (например, для пагинации); аннотации
+        среди них пропускаются.
+        """
+        model = cls.Meta.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+        only = {'id', *(column for column in columns if column in concrete)}
+        if parent_fk:
+            only.add(parent_fk)
+        select = []
+        for name in cls.Meta.fields:
+            if not field_requested(spec, name):
+                continue
+            if name in concrete:
+                only.add(name)
+            elif name in cls.select_related_fields:
+                relation, attr = cls.select_related_fields[name]
+                only.add(relation)
+                if relation != parent_fk:
+                    select.append(relation)
+                    only.add(f'{relation}__{attr}')
+            elif name in cls.prefetch_fields:
+                related_name, serializer_class, fk = cls.prefetch_fields[name]
+                nested = serializer_class.setup_eager_loading(
+                    serializer_class.Meta.model.objects.order_by('pk'),
+                    nested_spec(spec, name),
+                    parent_fk=fk
+                )
+                queryset = queryset.prefetch_related(Prefetch(related_name, queryset=nested))
+            elif name in cls.annotated_fields:
+                queryset = queryset.annotate(**{name: cls.annotation(name)})
+        if select:
+            queryset = queryset.select_related(*select)
+        if spec is not None:
+            queryset = queryset.only(*only)
+        return queryset
+    
+    @classmethod
+    def annotation(cls, name):
+        expression = cls.annotated_fields[name]
+        return expression() if callable(expression) else expression
+    
+    @classmethod
+    def values_queryset(cls, queryset, spec=None, parent_fk=None, columns=()):
+        """queryset.values() со всеми колонками, нужными fast_representation"""
+        concrete = {field.name for field in cls.Meta.model._meta.concrete_fields}
+        keys = {'id', *columns}
+        if parent_fk:
+            keys.add(parent_fk)
+        annotations = {}
+        for name in cls.Meta.fields:
+            if not field_requested(spec, name):
+                continue
+            if name in concrete:
+                keys.add(name)
+            elif name in cls.select_related_fields:
+                relation, attr = cls.select_related_fields[name]
+                keys.update([relation, f'{relation}__{attr}'])
+            elif name in cls.annotated_fields:
+                annotations[name] = cls.annotation(name)
+        return queryset.values(*sorted(keys), **annotations)
+    
+    @classmethod
+    def fast_representation(cls, rows, spec=None):
+        """Вывод для списка строк values(), совпадающий с to_representation.
+        
+        Обходит механизм полей DRF и создание моделей: для каждого поля один
+        раз выбирается форматтер, вложенные связи читаются одним запросом на
+        уровень, как и при prefetch_related.
+        """
+        nested = {}
+        for name, serializer_class, child_spec, fk, queryset in cls._nested_querysets(rows, spec):
+            child_rows = list(queryset)
+            items = serializer_class.fast_representation(child_rows, child_spec)
+            nested[name] = cls._group_by_parent(child_rows, items, fk)
+        return cls._build_representation(rows, spec, nested)
+    
+    @classmethod
+    async def afast_representation(cls, rows, spec=None):
+        """То же, что fast_representation, но вложенные связи читаются async ORM"""
+        nested = {}
+        for name, serializer_class, child_spec, fk, queryset in cls._nested_querysets(rows, spec):
+            child_rows = [row async for row in queryset]
+            items = await serializer_class.afast_representation(child_rows, child_spec)
+            nested[name] = cls._group_by_parent(child_rows, items, fk)
+        return cls._build_representation(rows, spec, nested)
+    
+    @classmethod
+    def _nested_querysets(cls, rows, spec):
+        ids = [row['id'] for row in rows]
+        for name, (related_name, serializer_class, fk) in cls.prefetch_fields.items():
+            if not field_requested(spec, name):
+                continue
+            child_spec = nested_spec(spec, name)
+            queryset = serializer_class.values_queryset(
+                serializer_class.Meta.model.objects.filter(**{f'{fk}__in': ids}).order_by('pk'),
+                child_spec, parent_fk=fk
+            )
+            yield name, serializer_class, child_spec, fk, queryset
+    
+    @staticmethod
+    def _group_by_parent(child_rows, items, fk):
+        grouped = {}
+        for child_row, item in zip(child_rows, items):
+            grouped.setdefault(child_row[fk], []).append(item)
+        return grouped
+    
+    @classmethod
+    def _build_representation(cls, rows, spec, nested):
+        fields = cls().fields
+        plan = []
+        for name in cls.Meta.fields:
+            if not field_requested(spec, name):
+                continue
+            if name in nested:
+                plan.append((name, None, None, None, nested[name]))
+            elif name in cls.select_related_fields:
+                relation, attr = cls.select_related_fields[name]
+                # При пустой связи DRF пропускает поле целиком (SkipField)
+                plan.append((name, f'{relation}__{attr}', None, relation, None))
+            else:
+                plan.append((name, name, _fast_formatter(fields[name]), None, None))
+        
+        result = []
+        for row in rows:
+            item = {}
+            for name, key, formatter, skip_if_null, children in plan:
+                if children is not None:
+                    item[name] = children.get(row['id'], [])
+                elif skip_if_null and row[skip_if_null] is None:
+                    continue
+                else:
+                    value = row[key]
+                    item[name] = value if formatter is None or value is None else formatter(value)
+            result.append(item)
+        return result
+    
+    @classmethod
+    def validator_aggregates(cls, spec=None, prefix='', parent_fk=None):
+        """Агрегаты для ETag/Last-Modified по запрошенным полям.
+        
+        Число строк и MAX(updated_at) по самой модели и по вложенным связям,
+        плюс MAX(updated_at) связанных моделей, из которых берутся поля вроде
+        project_title. Меняются при любом изменении данных в выводе.
+        Родитель (parent_fk) уже учтен на уровень выше.
+        """
+        alias = prefix.replace('__', '_')
+        aggregates = {
+            f'{alias}count': Count(f'{prefix}id', distinct=True),
+            f'{alias}updated_at': Max(f'{prefix}updated_at'),
+        }
+        for name in cls.Meta.fields:
+            if not field_requested(spec, name):
+                continue
+            if name in cls.select_related_fields:
+                relation, attr = cls.select_related_fields[name]
+                if relation == parent_fk:
+                    continue
+                related_model = cls.Meta.model._meta.get_field(relation).related_model
+                if any(field.name == 'updated_at' for field in related_model._meta.concrete_fields):
+                    aggregates[f'{alias}{relation}_updated_at'] = Max(f'{prefix}{relation}__updated_at')
+            elif name in cls.annotated_validators:
+                aggregates[f'{alias}{name}'] = cls.annotated_validators[name](prefix)
+            elif name in cls.prefetch_fields:
+                related_name, serializer_class, fk = cls.prefetch_fields[name]
+                aggregates.update(serializer_class.validator_aggregates(
+                    nested_spec(spec, name),
+                    prefix=f'{prefix}{related_name}__', parent_fk=fk
+                ))
+        return aggregates
+
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author_name = serializers.CharField(source='author.username', read_only=True)
     
+    select_related_fields = {'author_name': ('author', 'username')}
+    
     class Meta:
         model = Comment
         fields = ['id', 'author', 'author_name', 'content', 'created_at', 'updated_at']
         read_only_fields = ['author', 'created_at', 'updated_at']
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     assigned_to_name = serializers.CharField(source='assigned_to.username', read_only=True)
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
     project_title = serializers.CharField(source='project.title', read_only=True)
+    is_overdue = serializers.BooleanField(read_only=True)
     comments = CommentSerializer(many=True, read_only=True)
     
+    select_related_fields = {
+        'assigned_to_name': ('assigned_to', 'username'),
+        'created_by_name': ('created_by', 'username'),
+        'project_title': ('project', 'title'),
+    }
+    prefetch_fields = {'comments': ('comments', CommentSerializer, 'task')}
+    # Просрочка считается в SQL (Task.overdue_q); число просроченных меняет
+    # ETag, когда задача становится просроченной со сменой даты
+    annotated_fields = {
+        'is_overdue': Task.overdue_annotation,
+    }
+    annotated_validators = {
+        'is_overdue': lambda prefix: Count(f'{prefix}id', filter=Task.overdue_q(prefix), distinct=True),
+    }
+    
     class Meta:
         model = Task
         fields = [
             'id', 'title', 'description', 'project', 'project_title',
             'assigned_to', 'assigned_to_name', 'priority', 'status',
-            'due_date', 'created_by', 'created_by_name', 'created_at',
+            'due_date', 'is_overdue', 'created_by', 'created_by_name', 'created_at',
             'updated_at', 'comments'
         ]
         read_only_fields = ['created_by', 'created_at', 'updated_at']
 
-class ProjectSerializer(serializers.ModelSerializer):
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который ищет объекты в context['related_objects'].
+    
+    Позволяет проверить пачку объектов без отдельного запроса на каждый FK.
+    """
+    
+    def to_internal_value(self, data):
+        objects = self.context.get('related_objects', {}).get(self.get_queryset().model)
+        if objects is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return objects[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+class TaskBulkSerializer(TaskSerializer):
+    """Сериализатор элемента пакетной операции над задачами"""
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+
+class ProjectSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
     tasks = TaskSerializer(many=True, read_only=True)
-    tasks_count = serializers.IntegerField(source='tasks.count', read_only=True)
+    tasks_count = serializers.SerializerMethodField()
+    
+    select_related_fields = {'created_by_name': ('created_by', 'username')}
+    prefetch_fields = {'tasks': ('tasks', TaskSerializer, 'project')}
+    annotated_fields = {'tasks_count': Count('tasks')}
     
     class Meta:
         model = Project
@@ -54,6 +380,12 @@ class ProjectSerializer(serializers.ModelSerializer):
             'tasks_count'
         ]
         read_only_fields = ['created_by', 'created_at', 'updated_at']
+    
+    def get_tasks_count(self, obj):
+        # Аннотация из setup_eager_loading; у только что созданного проекта её нет
+        if hasattr(obj, 'tasks_count'):
+            return obj.tasks_count
+        return obj.tasks.count()
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -1,9 +1,35 @@
+import csv
+import gzip
+import json
+import warnings
+from datetime import date, timedelta
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.contrib.auth.models import User
-from rest_framework.test import APIClient
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
-from projects.models import Project, Task
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from projects.models import Project, Task, Comment, Tombstone
+from project_manager.query_budget import QueryBudgetTestMixin
 from accounts.models import UserProfile
+from .filters import KeysetOrderingFilter, TaskFilter
+from .renderers import msgpack
+from .pagination import TaskCursorPagination
+from .serializers import parse_field_spec
+from .views import TaskViewSet
 
 class APIAuthenticationTests(TestCase):
     def setUp(self):
@@ -90,4 +116,1345 @@ class APIRoleBasedTests(TestCase):
         # Должна быть только одна задача - та, что назначена на user1
         user1_tasks = [task for task in tasks if task['assigned_to'] == self.user1.id]
         self.assertEqual(len(user1_tasks), 1)
-        self.assertEqual(user1_tasks[0]['title'], 'Task for User1')
\ No newline at end of file
+        self.assertEqual(user1_tasks[0]['title'], 'Task for User1')
+
+class APIQueryCountTests(TestCase):
+    """Количество запросов на страницу не зависит от объема данных"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user('user', password='user123')
+        self.client.force_authenticate(user=self.manager)
+    
+    def create_projects(self, projects, tasks_per_project, comments_per_task):
+        for i in range(projects):
+            project = Project.objects.create(title=f'Project {i}', created_by=self.manager)
+            for j in range(tasks_per_project):
+                task = Task.objects.create(
+                    title=f'Task {i}-{j}',
+                    project=project,
+                    assigned_to=self.user,
+                    created_by=self.manager
+                )
+                for k in range(comments_per_task):
+                    Comment.objects.create(task=task, author=self.user, content=f'Comment {k}')
+    
+    def test_project_list_query_count(self):
+        """Тест фиксированного числа запросов для /api/projects/"""
+        # COUNT для пагинации, проекты с аннотацией, задачи, комментарии, валидаторы ETag страницы
+        self.create_projects(1, 1, 1)
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/projects/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        self.create_projects(5, 4, 3)
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/projects/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][-1]['tasks_count'], 4)
+    
+    def test_task_list_query_count(self):
+        """Тест фиксированного числа запросов для /api/tasks/"""
+        # Keyset-пагинация без COUNT: задачи, комментарии, валидаторы ETag страницы
+        self.create_projects(1, 1, 1)
+        with self.assertNumQueries(3):
+            self.client.get('/api/tasks/')
+        
+        self.create_projects(3, 5, 4)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/tasks/')
+        task = response.json()['results'][0]
+        self.assertEqual(task['assigned_to_name'], 'user')
+        self.assertEqual(len(task['comments']), 4)
+    
+    def test_comment_list_query_count(self):
+        """Тест фиксированного числа запросов для /api/comments/"""
+        self.create_projects(2, 3, 3)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/comments/')
+        self.assertEqual(response.json()['results'][0]['author_name'], 'user')
+
+
+class APICursorPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.client.force_authenticate(user=self.manager)
+        self.project = Project.objects.create(title='Test Project', created_by=self.manager)
+        self.tasks = [
+            Task.objects.create(title=f'Task {i}', project=self.project, created_by=self.manager)
+            for i in range(25)
+        ]
+    
+    def test_cursor_walks_all_tasks(self):
+        """Тест обхода всех задач по курсору без пропусков и повторов"""
+        seen = []
+        url = '/api/tasks/?page_size=7'
+        while url:
+            data = self.client.get(url).json()
+            self.assertNotIn('count', data)
+            seen.extend(task['id'] for task in data['results'])
+            url = data['next']
+        self.assertEqual(seen, [task.id for task in reversed(self.tasks)])
+    
+    def test_max_page_size(self):
+        """Тест ограничения page_size настройкой API_CURSOR_MAX_PAGE_SIZE"""
+        with self.settings(API_CURSOR_MAX_PAGE_SIZE=5):
+            data = self.client.get('/api/tasks/?page_size=1000').json()
+        self.assertEqual(len(data['results']), 5)
+    
+    def test_invalid_cursor(self):
+        """Тест обработки поддельного курсора"""
+        response = self.client.get('/api/tasks/?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class APISparseFieldsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.client.force_authenticate(user=self.manager)
+        self.project = Project.objects.create(title='Test Project', description='Long text', created_by=self.manager)
+        self.task = Task.objects.create(
+            title='Test Task', description='Long text', project=self.project, created_by=self.manager
+        )
+        Comment.objects.create(task=self.task, author=self.manager, content='Comment')
+    
+    def test_parse_field_spec(self):
+        """Тест разбора ?fields= и ?expand= в дерево полей"""
+        self.assertIsNone(parse_field_spec(None, None))
+        self.assertEqual(
+            parse_field_spec(None, 'tasks.comments'),
+            {'*': None, 'tasks': {'*': None, 'comments': None}}
+        )
+        self.assertEqual(
+            parse_field_spec('id,tasks.title', 'tasks.comments'),
+            {'id': None, 'tasks': {'title': None, 'comments': None}}
+        )
+        self.assertEqual(parse_field_spec('tasks,tasks.title'), {'tasks': None})
+    
+    def test_project_fields_skip_nested(self):
+        """Тест: без запроса вложенные задачи не выводятся и не загружаются"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/projects/?fields=id,title,status')
+        self.assertEqual(response.json()['results'][0], {
+            'id': self.project.id, 'title': 'Test Project', 'status': 'active'
+        })
+        # COUNT, сами проекты без prefetch задач и валидаторы страницы; описание отложено
+        self.assertEqual(len(queries), 3)
+        self.assertNotIn('projects_task', queries[1]['sql'])
+        self.assertNotIn('description', queries[1]['sql'])
+    
+    def test_project_expand_nested_fields(self):
+        """Тест выборочных полей во вложенных сериализаторах"""
+        response = self.client.get('/api/projects/?fields=id,tasks.title&expand=tasks.comments')
+        project = response.json()['results'][0]
+        self.assertEqual(list(project), ['id', 'tasks'])
+        self.assertEqual(list(project['tasks'][0]), ['title', 'comments'])
+        self.assertEqual(project['tasks'][0]['comments'][0]['content'], 'Comment')
+    
+    def test_project_expand_without_fields(self):
+        """Тест: ?expand= без ?fields= выводит все поля и вложенные объекты целиком"""
+        expected = self.client.get('/api/projects/').json()['results'][0]
+        response = self.client.get('/api/projects/?expand=tasks.comments')
+        project = response.json()['results'][0]
+        self.assertEqual(project, expected)
+        self.assertEqual(project['tasks'][0]['comments'][0]['content'], 'Comment')
+        
+        response = self.client.get('/api/projects/?fields=id&expand=tasks')
+        project = response.json()['results'][0]
+        self.assertEqual(list(project), ['id', 'tasks'])
+        self.assertEqual(project['tasks'][0], expected['tasks'][0])
+    
+    def test_task_fields_with_related_name(self):
+        """Тест выборочных полей задачи со связанными именами"""
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/tasks/?fields=id,project_title')
+        self.assertEqual(response.json()['results'][0], {
+            'id': self.task.id, 'project_title': 'Test Project'
+        })
+    
+    def test_fields_ignored_on_write(self):
+        """Тест: ?fields= не влияет на запись"""
+        response = self.client.post(f'/api/tasks/{self.task.id}/complete/?fields=id')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('comments', response.json())
+
+
+class APIBulkTaskTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user('user', password='user123')
+        self.project = Project.objects.create(title='Test Project', created_by=self.manager)
+        self.task = Task.objects.create(title='Old', project=self.project, created_by=self.manager)
+        self.other = Task.objects.create(title='Other', project=self.project, created_by=self.manager)
+    
+    def test_bulk_operations(self):
+        """Тест пакетного создания, изменения и удаления задач"""
+        self.client.force_authenticate(user=self.manager)
+        operations = [
+            {'op': 'create', 'data': {
+                'title': f'New {i}', 'description': 'Bulk', 'project': self.project.id,
+                'assigned_to': self.user.id
+            }}
+            for i in range(50)
+        ]
+        operations.append({'op': 'update', 'id': self.task.id, 'data': {'status': 'done'}})
+        operations.append({'op': 'delete', 'id': self.other.id})
+        
+        # Проекты, пользователи, задачи, SAVEPOINT, INSERT, UPDATE, удаление с каскадом
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/tasks/bulk/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLess(len(queries), 15)
+        
+        results = response.json()['results']
+        self.assertEqual(len(results), 52)
+        self.assertEqual(results[-2], {'op': 'update', 'id': self.task.id, 'status': 'updated'})
+        self.assertEqual(results[-1], {'op': 'delete', 'id': self.other.id, 'status': 'deleted'})
+        created = Task.objects.get(pk=results[0]['id'])
+        self.assertEqual(created.created_by, self.manager)
+        self.assertEqual(created.assigned_to, self.user)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'done')
+        self.assertFalse(Task.objects.filter(pk=self.other.id).exists())
+    
+    def test_bulk_sets_priority_rank(self):
+        """Тест: пакетные создание и изменение заполняют ранг приоритета"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.post('/api/tasks/bulk/', {'operations': [
+            {'op': 'create', 'data': {
+                'title': 'New', 'description': 'Bulk', 'project': self.project.id, 'priority': 'low'
+            }},
+            {'op': 'update', 'id': self.task.id, 'data': {'priority': 'high'}},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ranks = dict(Task.objects.values_list('title', 'priority_rank'))
+        self.assertEqual(ranks, {'New': 0, 'Old': 2, 'Other': 1})
+    
+    def test_bulk_is_atomic(self):
+        """Тест: при ошибке в одной операции ничего не записывается"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.post('/api/tasks/bulk/', {'operations': [
+            {'op': 'create', 'data': {'title': 'New', 'description': 'Bulk', 'project': self.project.id}},
+            {'op': 'create', 'data': {'title': 'Broken', 'description': 'Bulk', 'project': 999}},
+            {'op': 'delete', 'id': self.task.id},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['errors'][0]['index'], 1)
+        self.assertEqual(Task.objects.count(), 2)
+    
+    def test_bulk_respects_visibility(self):
+        """Тест: пользователь не может изменять чужие задачи пакетом"""
+        self.task.assigned_to = self.user
+        self.task.save()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/tasks/bulk/', {'operations': [
+            {'op': 'update', 'id': self.task.id, 'data': {'status': 'review'}},
+            {'op': 'delete', 'id': self.other.id},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['errors'], [{'index': 1, 'errors': {'id': ['Задача не найдена']}}])
+
+
+class APIConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.client.force_authenticate(user=self.manager)
+        self.project = Project.objects.create(title='Test Project', created_by=self.manager)
+        self.task = Task.objects.create(title='Test Task', project=self.project, created_by=self.manager)
+    
+    def test_list_not_modified(self):
+        """Тест 304 для списка без изменений: только id страницы и валидаторы"""
+        response = self.client.get('/api/projects/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        
+        # COUNT и id страницы для PageNumberPagination, валидаторы
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/projects/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        
+        etag = self.client.get('/api/tasks/')['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_project_page_ids_ordered(self):
+        """Тест: id страницы для 304 выбираются в том же порядке, что и отдаваемая страница"""
+        etag = self.client.get('/api/projects/')['ETag']
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UnorderedObjectListWarning)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/projects/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn('ORDER BY', queries[1]['sql'])
+    
+    def test_validators_cover_only_served_page(self):
+        """Тест: валидаторы считаются по строкам страницы, а не по всей выборке"""
+        older = Task.objects.create(title='Older', project=self.project, created_by=self.manager)
+        Task.objects.filter(pk=older.pk).update(created_at=self.task.created_at - timedelta(days=1))
+        with CaptureQueriesContext(connection) as queries:
+            etag = self.client.get('/api/tasks/?page_size=1')['ETag']
+        validators = queries[-1]['sql']
+        self.assertIn('MAX(', validators)
+        self.assertIn(f'IN ({self.task.pk})', validators)
+        
+        # Изменение задачи вне страницы не меняет ETag, изменение на странице - меняет
+        Comment.objects.create(task=older, author=self.manager, content='Outside')
+        response = self.client.get('/api/tasks/?page_size=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        Comment.objects.create(task=self.task, author=self.manager, content='Inside')
+        response = self.client.get('/api/tasks/?page_size=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_nested_change_invalidates_etag(self):
+        """Тест: изменение или удаление вложенных объектов меняет ETag проекта"""
+        url = f'/api/projects/{self.project.id}/'
+        etag = self.client.get(url)['ETag']
+        
+        comment = Comment.objects.create(task=self.task, author=self.manager, content='New')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        etag = response['ETag']
+        comment.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_etag_depends_on_query(self):
+        """Тест: другие параметры запроса - другой ETag"""
+        etag = self.client.get('/api/tasks/')['ETag']
+        response = self.client.get('/api/tasks/?fields=id', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_if_modified_since(self):
+        """Тест 304 по If-Modified-Since"""
+        url = f'/api/tasks/{self.task.id}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_invisible_object_is_not_found(self):
+        """Тест: для чужой задачи по-прежнему 404, а не 304"""
+        user = User.objects.create_user('user', password='user123')
+        self.client.force_authenticate(user=user)
+        response = self.client.get(f'/api/tasks/{self.task.id}/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_malformed_id_is_not_found(self):
+        """Тест: некорректный id - 404"""
+        response = self.client.get('/api/tasks/abc/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class APITaskExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user('user', password='user123')
+        self.project = Project.objects.create(title='Test Project', created_by=self.manager)
+        self.other_project = Project.objects.create(title='Other Project', created_by=self.manager)
+        self.task = Task.objects.create(
+            title='Задача, с запятой', description='Text', project=self.project,
+            assigned_to=self.user, created_by=self.manager
+        )
+        Task.objects.create(title='Other', description='Text', project=self.other_project, created_by=self.manager)
+    
+    def test_export_ndjson(self):
+        """Тест потоковой выгрузки задач в NDJSON"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get('/api/tasks/export/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        row = json.loads(lines[0])
+        self.assertEqual(row['title'], 'Задача, с запятой')
+        self.assertEqual(row['project'], self.project.id)
+        self.assertEqual(row['project_title'], 'Test Project')
+        self.assertEqual(row['assigned_to_name'], 'user')
+        self.assertEqual(list(row), TaskViewSet.EXPORT_FIELDS)
+    
+    def test_export_csv_for_project(self):
+        """Тест выгрузки задач проекта в CSV"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(f'/api/tasks/export/?output=csv&project={self.project.id}')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], TaskViewSet.EXPORT_FIELDS)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][1], 'Задача, с запятой')
+    
+    def test_export_respects_roles(self):
+        """Тест: пользователь выгружает только свои задачи"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/tasks/export/')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.task.id])
+    
+    def test_export_invalid_output(self):
+        """Тест: неизвестный формат выгрузки"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get('/api/tasks/export/?output=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class APIChangeFeedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user('user', password='user123')
+        self.project = Project.objects.create(title='Test Project', created_by=self.manager)
+        self.task = Task.objects.create(
+            title='Test Task', project=self.project, assigned_to=self.user, created_by=self.manager
+        )
+        self.other_task = Task.objects.create(title='Other', project=self.project, created_by=self.manager)
+    
+    def get_changes(self, watermark=None):
+        url = '/api/changes/' if watermark is None else f'/api/changes/?since={watermark}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+    
+    def test_changes_since_watermark(self):
+        """Тест: лента возвращает только изменения после watermark"""
+        self.client.force_authenticate(user=self.manager)
+        data = self.get_changes()
+        self.assertEqual(data['tasks'], [])
+        
+        self.task.status = 'done'
+        self.task.save()
+        comment = Comment.objects.create(task=self.task, author=self.user, content='Done')
+        data = self.get_changes(data['watermark'])
+        self.assertEqual([task['id'] for task in data['tasks']], [self.task.id])
+        self.assertEqual(data['tasks'][0]['status'], 'done')
+        self.assertEqual(data['comments'][0]['task'], self.task.id)
+        self.assertEqual(data['projects'], [])
+        
+        # Повторный запрос с новым watermark - пусто
+        data = self.get_changes(data['watermark'])
+        self.assertEqual(data['tasks'] + data['comments'], [])
+        
+        comment_id, task_id = comment.id, self.other_task.id
+        comment.delete()
+        self.other_task.delete()
+        data = self.get_changes(data['watermark'])
+        self.assertEqual(
+            [(entry['model'], entry['object_id']) for entry in data['deleted']],
+            [('comment', comment_id), ('task', task_id)]
+        )
+    
+    def test_changes_respects_roles(self):
+        """Тест: пользователь видит изменения и удаления только своих задач"""
+        self.client.force_authenticate(user=self.user)
+        watermark = self.get_changes()['watermark']
+        self.other_task.save()
+        self.task.save()
+        data = self.get_changes(watermark)
+        self.assertEqual([task['id'] for task in data['tasks']], [self.task.id])
+        
+        other_id, task_id = self.other_task.id, self.task.id
+        self.other_task.delete()
+        self.task.delete()
+        data = self.get_changes(data['watermark'])
+        self.assertEqual([entry['object_id'] for entry in data['deleted']], [task_id])
+        self.assertNotIn(other_id, [entry['object_id'] for entry in data['deleted']])
+    
+    def test_changes_paging(self):
+        """Тест: при превышении лимита лента отдается частями без пропусков"""
+        self.client.force_authenticate(user=self.manager)
+        watermark = self.get_changes()['watermark']
+        tasks = [
+            Task.objects.create(title=f'Task {i}', project=self.project, created_by=self.manager)
+            for i in range(5)
+        ]
+        seen = []
+        with self.settings(API_CHANGES_MAX_ROWS=2):
+            while True:
+                data = self.get_changes(watermark)
+                seen.extend(task['id'] for task in data['tasks'])
+                watermark = data['watermark']
+                if not data['has_more']:
+                    break
+        self.assertEqual(seen, [task.id for task in tasks])
+    
+    def test_late_commit_not_skipped(self):
+        """Тест: строка, закоммиченная после строки с большим временем, не теряется"""
+        self.client.force_authenticate(user=self.manager)
+        watermark = self.get_changes()['watermark']
+        self.task.save()
+        data = self.get_changes(watermark)
+        self.assertEqual([task['id'] for task in data['tasks']], [self.task.id])
+        
+        # Время поставлено до коммита: меньше, чем у уже отданной задачи
+        Task.objects.filter(pk=self.other_task.pk).update(updated_at=self.task.updated_at - timedelta(seconds=1))
+        data = self.get_changes(data['watermark'])
+        self.assertEqual([task['id'] for task in data['tasks']], [self.other_task.id])
+        
+        # Отданные строки окна повторно не приходят
+        data = self.get_changes(data['watermark'])
+        self.assertEqual(data['tasks'], [])
+    
+    def test_invalid_watermark(self):
+        """Тест: поддельный watermark отклоняется"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get('/api/changes/?since=forged')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_reassignment_removes_task(self):
+        """Тест: задача, снятая с пользователя, приходит ему в deleted"""
+        self.client.force_authenticate(user=self.user)
+        watermark = self.get_changes()['watermark']
+        self.task.assigned_to = self.manager
+        self.task.save()
+        data = self.get_changes(watermark)
+        self.assertEqual(data['tasks'], [])
+        self.assertEqual(
+            [(entry['object_id'], entry['reason']) for entry in data['deleted']],
+            [(self.task.id, 'unassigned')]
+        )
+        
+        # Менеджер по-прежнему видит задачу, удаления для него нет
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.get_changes(watermark)['deleted'], [])
+    
+    def test_reassignment_back_not_removed(self):
+        """Тест: задача, назначенная пользователю снова, не попадает в deleted"""
+        self.client.force_authenticate(user=self.user)
+        watermark = self.get_changes()['watermark']
+        self.task.assigned_to = None
+        self.task.save()
+        self.task.assigned_to = self.user
+        self.task.save()
+        data = self.get_changes(watermark)
+        self.assertEqual([task['id'] for task in data['tasks']], [self.task.id])
+        self.assertEqual(data['deleted'], [])
+    
+    def test_bulk_reassignment_removes_task(self):
+        """Тест: переназначение через /api/tasks/bulk/ тоже записывается"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.post('/api/tasks/bulk/', {'operations': [
+            {'op': 'update', 'id': self.task.id, 'data': {'assigned_to': self.manager.id}},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(Tombstone.objects.filter(
+            object_id=self.task.id, assigned_to_id=self.user.id, reason='unassigned'
+        ).exists())
+    
+    def test_expired_watermark(self):
+        """Тест: watermark старше срока хранения удалений отклоняется с 410"""
+        self.client.force_authenticate(user=self.manager)
+        watermark = self.get_changes()['watermark']
+        with self.settings(API_CHANGES_RETENTION_DAYS=-1):
+            response = self.client.get(f'/api/changes/?since={watermark}')
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+    
+    def test_prune_tombstones(self):
+        """Тест: prune_tombstones удаляет только записи старше срока хранения"""
+        self.other_task.delete()
+        Comment.objects.create(task=self.task, author=self.user, content='Old').delete()
+        Tombstone.objects.filter(model='task').update(deleted_at=timezone.now() - timedelta(days=31))
+        call_command('prune_tombstones', stdout=StringIO())
+        self.assertEqual(list(Tombstone.objects.values_list('model', flat=True)), ['comment'])
+    
+    def test_changes_use_index(self):
+        """Тест: выборка изменений задач идет по индексу (updated_at, id)"""
+        queryset = Task.objects.filter(updated_at__gte=self.task.updated_at).exclude(
+            updated_at=self.task.updated_at, id__lte=self.task.id
+        ).order_by('updated_at', 'id')
+        self.assertIn('task_updated_id_idx', queryset.explain())
+
+
+class APIFastListTests(TestCase):
+    """Быстрый путь list() выдает тот же JSON, что и сериализаторы"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user('user', password='user123')
+        self.client.force_authenticate(user=self.manager)
+        for i in range(3):
+            project = Project.objects.create(title=f'Проект {i}', description='Описание', created_by=self.manager)
+            for j in range(4):
+                task = Task.objects.create(
+                    title=f'Task "{i}-{j}"', description='Line\nbreak', project=project,
+                    assigned_to=self.user if j % 2 else None, created_by=self.manager,
+                    due_date=date(2030, 1, j + 1) if j % 3 else None, priority='high'
+                )
+                for k in range(j):
+                    Comment.objects.create(task=task, author=self.user, content=f'Комментарий {k}')
+        Project.objects.create(title='Empty', description='', created_by=self.manager)
+    
+    def assert_same_output(self, viewset, url):
+        with patch.object(viewset, 'fast_list', False):
+            expected = self.client.get(url)
+        actual = self.client.get(url)
+        self.assertEqual(actual.status_code, status.HTTP_200_OK)
+        self.assertEqual(actual.content, expected.content)
+    
+    def test_tasks_identical(self):
+        """Тест совпадения JSON списка задач"""
+        from .views import TaskViewSet
+        self.assert_same_output(TaskViewSet, '/api/tasks/')
+        self.assert_same_output(TaskViewSet, '/api/tasks/?page_size=5')
+        self.assert_same_output(TaskViewSet, '/api/tasks/?fields=id,assigned_to_name,due_date')
+        self.assert_same_output(TaskViewSet, '/api/tasks/?fields=title,comments.content')
+        cursor = self.client.get('/api/tasks/?page_size=5').json()['next']
+        self.assert_same_output(TaskViewSet, cursor)
+    
+    def test_projects_identical(self):
+        """Тест совпадения JSON списка проектов с вложенными задачами"""
+        from .views import ProjectViewSet
+        self.assert_same_output(ProjectViewSet, '/api/projects/')
+        self.assert_same_output(ProjectViewSet, '/api/projects/?page=1&fields=id,tasks_count')
+        self.assert_same_output(ProjectViewSet, '/api/projects/?fields=id,tasks.project_title')
+    
+    def test_fast_list_query_count(self):
+        """Тест: быстрый путь не добавляет запросов"""
+        # COUNT, проекты, задачи, комментарии, валидаторы ETag страницы
+        with self.assertNumQueries(5):
+            self.client.get('/api/projects/')
+
+
+class APIAsyncViewsTests(TestCase):
+    """Тесты асинхронных представлений чтения"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user('user', password='user123')
+        self.token = Token.objects.create(user=self.user)
+        project = Project.objects.create(title='Проект', description='Описание', created_by=self.manager)
+        for i in range(5):
+            task = Task.objects.create(
+                title=f'Задача {i}', description='Описание', project=project,
+                assigned_to=self.user if i % 2 else None, created_by=self.manager,
+                due_date=date(2030, 1, i + 1) if i % 2 else None
+            )
+            Comment.objects.create(task=task, author=self.user, content=f'Комментарий {i}')
+        self.task = task
+    
+    async def test_requires_authentication(self):
+        """Тест: без аутентификации и с неверным токеном доступ запрещен"""
+        response = await self.async_client.get('/api/async/tasks/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = await self.async_client.get('/api/async/tasks/', headers={'Authorization': 'Token invalid'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.json(), {'detail': 'Invalid token.'})
+    
+    async def test_token_auth_applies_role(self):
+        """Тест: пользователь по токену видит только назначенные задачи"""
+        response = await self.async_client.get(
+            '/api/async/tasks/', headers={'Authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(task['assigned_to'] == self.user.id for task in results))
+        response = await self.async_client.get(
+            f'/api/async/tasks/{self.task.id}/', headers={'Authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_token_auth_uses_cache(self):
+        """Тест: токен проверяется через кэш CachedTokenAuthentication, как в синхронном API"""
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.client.get('/api/async/tasks/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/async/tasks/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('authtoken_token', sql)
+        self.assertNotIn('accounts_userprofile', sql)
+        
+        # Сброс кэша при удалении токена действует и на асинхронный путь
+        self.token.delete()
+        response = self.client.get('/api/async/tasks/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    async def test_session_auth(self):
+        """Тест: менеджер по сессии видит все задачи"""
+        await sync_to_async(self.async_client.force_login)(self.manager)
+        response = await self.async_client.get('/api/async/tasks/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 5)
+    
+    async def test_only_get_allowed(self):
+        """Тест: асинхронные представления только для чтения"""
+        await sync_to_async(self.async_client.force_login)(self.manager)
+        response = await self.async_client.post('/api/async/tasks/', {})
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+    
+    def test_output_matches_sync_views(self):
+        """Тест совпадения JSON с синхронными эндпоинтами"""
+        self.client.force_authenticate(user=self.manager)
+        self.client.force_login(self.manager)
+        for sync_url, async_url in (
+            ('/api/tasks/', '/api/async/tasks/'),
+            ('/api/tasks/?fields=id,comments.content', '/api/async/tasks/?fields=id,comments.content'),
+            ('/api/comments/', '/api/async/comments/'),
+            (f'/api/tasks/{self.task.id}/', f'/api/async/tasks/{self.task.id}/'),
+            ('/api/projects/', '/api/async/projects/'),
+            (f'/api/projects/{self.task.project_id}/', f'/api/async/projects/{self.task.project_id}/'),
+        ):
+            expected = self.client.get(sync_url).json()
+            actual = self.client.get(async_url).json()
+            if 'results' in expected:
+                expected, actual = expected['results'], actual['results']
+            self.assertEqual(actual, expected, async_url)
+    
+    def test_cursor_pagination(self):
+        """Тест обхода задач по курсору без повторов"""
+        self.client.force_login(self.manager)
+        url, ids = '/api/async/tasks/?page_size=2', []
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data['results']), 2)
+            ids.extend(task['id'] for task in data['results'])
+            url = data['next']
+        self.assertEqual(ids, list(Task.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+        response = self.client.get('/api/async/tasks/?cursor=broken')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class APICachedTokenAuthTests(TestCase):
+    """Тесты кэширования аутентификации по токену"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user('user', password='user123')
+        self.manager = User.objects.create_user('manager', password='manager123')
+        project = Project.objects.create(title='Проект', description='Описание', created_by=self.manager)
+        Task.objects.create(title='Чужая', description='', project=project, created_by=self.manager)
+        Task.objects.create(
+            title='Своя', description='', project=project, created_by=self.manager, assigned_to=self.user
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+    
+    def tasks_count(self):
+        response = self.client.get('/api/tasks/')
+        if response.status_code != status.HTTP_200_OK:
+            return response.status_code
+        return len(response.json()['results'])
+    
+    def test_cached_request_skips_auth_queries(self):
+        """Тест: повторный запрос не обращается к токену и профилю"""
+        with patch.object(TaskViewSet, 'authentication_classes', [TokenAuthentication]):
+            with CaptureQueriesContext(connection) as uncached:
+                self.client.get('/api/tasks/')
+            uncached_count = len(uncached)
+        self.client.get('/api/tasks/')
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get('/api/tasks/')
+        sql = ' '.join(query['sql'] for query in cached.captured_queries)
+        self.assertEqual(uncached_count - len(cached), 2)
+        self.assertNotIn('authtoken_token', sql)
+        self.assertNotIn('accounts_userprofile', sql)
+    
+    def test_role_change_invalidates(self):
+        """Тест: смена роли сразу меняет видимость задач"""
+        self.assertEqual(self.tasks_count(), 1)
+        self.user.userprofile.role = 'manager'
+        self.user.userprofile.save()
+        self.assertEqual(self.tasks_count(), 2)
+    
+    def test_deactivation_invalidates(self):
+        """Тест: деактивированный пользователь теряет доступ"""
+        self.assertEqual(self.tasks_count(), 1)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.tasks_count(), status.HTTP_403_FORBIDDEN)
+    
+    def test_token_delete_invalidates(self):
+        """Тест: удаленный токен больше не принимается"""
+        self.assertEqual(self.tasks_count(), 1)
+        self.token.delete()
+        self.assertEqual(self.tasks_count(), status.HTTP_403_FORBIDDEN)
+
+
+class APIStatsTests(TestCase):
+    """Тесты сводной статистики /api/stats/"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user('user', password='user123')
+        self.project = Project.objects.create(title='Проект', description='', created_by=self.manager)
+        for i, task_status in enumerate(['todo', 'todo', 'done']):
+            Task.objects.create(
+                title=f'Задача {i}', description='', project=self.project, created_by=self.manager,
+                status=task_status, assigned_to=self.user if i else None
+            )
+    
+    def test_stats_scoped_to_visible_tasks(self):
+        """Тест: пользователь видит счетчики только своих задач"""
+        self.client.force_authenticate(user=self.manager)
+        data = self.client.get('/api/stats/').json()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual(data['by_status']['todo'], 2)
+        self.client.force_authenticate(user=self.user)
+        data = self.client.get('/api/stats/').json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['by_status'], {'todo': 1, 'in_progress': 0, 'review': 0, 'done': 1})
+        self.assertEqual(data['by_project'][0]['project_title'], 'Проект')
+    
+    def test_dashboard_endpoint(self):
+        """Тест: /api/dashboard/ отдает данные главной страницы одним ответом"""
+        self.client.force_authenticate(user=self.user)
+        data = self.client.get('/api/dashboard/').json()
+        self.assertEqual(
+            set(data),
+            {'my_tasks', 'overdue_tasks', 'status_counts', 'total_tasks', 'overdue_count',
+             'recent_comments', 'active_projects'}
+        )
+        self.assertEqual([task['title'] for task in data['my_tasks']], ['Задача 1'])
+        self.assertEqual(data['status_counts']['done'], 1)
+        self.assertEqual(data['active_projects'][0]['open_tasks'], 2)
+    
+    def test_bulk_update_invalidates_stats(self):
+        """Тест: пакетное изменение сбрасывает закэшированную статистику"""
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.client.get('/api/stats/').json()['by_status']['done'], 1)
+        task = Task.objects.filter(status='todo').first()
+        response = self.client.post('/api/tasks/bulk/', {
+            'operations': [{'op': 'update', 'id': task.id, 'data': {'status': 'done'}}]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/stats/').json()['by_status']['done'], 2)
+
+
+class APITaskFilterTests(TestCase):
+    """Тесты фильтрации и сортировки списка задач"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user('user', password='user123')
+        self.client.force_authenticate(user=self.manager)
+        self.project = Project.objects.create(title='A', description='', created_by=self.manager)
+        self.other = Project.objects.create(title='B', description='', created_by=self.manager)
+        specs = [
+            ('todo', 'high', self.project, self.manager, date(2030, 1, 5)),
+            ('todo', 'low', self.project, self.user, None),
+            ('in_progress', 'medium', self.other, self.user, date(2030, 1, 1)),
+            ('done', 'high', self.other, None, date(2030, 1, 5)),
+            ('review', 'low', self.project, None, date(2030, 2, 1)),
+        ]
+        self.tasks = [
+            Task.objects.create(
+                title=f'Задача {i}', description='', status=task_status, priority=priority,
+                project=project, assigned_to=assignee, due_date=due_date, created_by=self.manager
+            )
+            for i, (task_status, priority, project, assignee, due_date) in enumerate(specs)
+        ]
+    
+    def ids(self, query):
+        response = self.client.get(f'/api/tasks/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return sorted(task['id'] for task in response.json()['results'])
+    
+    def expected(self, *indexes):
+        return sorted(self.tasks[i].id for i in indexes)
+    
+    def test_filters(self):
+        """Тест фильтров по статусу, приоритету, проекту, исполнителю и сроку"""
+        self.assertEqual(self.ids('status=todo,done'), self.expected(0, 1, 3))
+        self.assertEqual(self.ids('status=todo&status=review'), self.expected(0, 1, 4))
+        self.assertEqual(self.ids('priority=high'), self.expected(0, 3))
+        self.assertEqual(self.ids(f'project={self.other.id}'), self.expected(2, 3))
+        self.assertEqual(self.ids('assigned_to=me'), self.expected(0))
+        self.assertEqual(self.ids(f'assigned_to={self.user.id}&status=todo'), self.expected(1))
+        self.assertEqual(self.ids('assigned_to=none'), self.expected(3, 4))
+        self.assertEqual(self.ids('due_date_after=2030-01-05'), self.expected(0, 3, 4))
+        self.assertEqual(self.ids('due_date_after=2030-01-02&due_date_before=2030-01-31'), self.expected(0, 3))
+    
+    def test_filters_respect_visibility(self):
+        """Тест: фильтры работают внутри видимых пользователю задач"""
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.ids('assigned_to=me'), self.expected(1, 2))
+        self.assertEqual(self.ids('status=done'), [])
+    
+    def test_invalid_filters(self):
+        """Тест: некорректные значения фильтров дают 400"""
+        for query in ('status=unknown', 'priority=urgent', 'project=abc',
+                      'assigned_to=someone', 'due_date_before=2030-13-01'):
+            response = self.client.get(f'/api/tasks/?{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+            self.assertIn(query.split('=')[0], response.json())
+    
+    def walk(self, query):
+        """Проходит все страницы вперед, затем назад по ссылкам previous"""
+        url, pages = f'/api/tasks/?{query}&page_size=2', []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([task['id'] for task in data['results']])
+            url, previous = data['next'], data['previous']
+        backward = [pages[-1]]
+        while previous:
+            data = self.client.get(previous).json()
+            backward.insert(0, [task['id'] for task in data['results']])
+            previous = data['previous']
+        self.assertEqual(backward, pages)
+        return [pk for page in pages for pk in page]
+    
+    def test_ordering_by_due_date(self):
+        """Тест сортировки по сроку: повторы и NULL листаются без потерь"""
+        ids = [task.id for task in self.tasks]
+        self.assertEqual(self.walk('ordering=due_date'), [ids[2], ids[0], ids[3], ids[4], ids[1]])
+        self.assertEqual(self.walk('ordering=-due_date'), [ids[4], ids[3], ids[0], ids[2], ids[1]])
+    
+    def test_ordering_by_priority(self):
+        """Тест сортировки по рангу приоритета, а не по алфавиту"""
+        ids = [task.id for task in self.tasks]
+        self.assertEqual(self.walk('ordering=-priority'), [ids[3], ids[0], ids[2], ids[4], ids[1]])
+        self.assertEqual(self.walk('ordering=priority&status=todo,review'), [ids[1], ids[4], ids[0]])
+    
+    def test_ordering_matches_serializer_path(self):
+        """Тест: быстрый путь и сериализатор дают одинаковые страницы"""
+        for query in ('ordering=priority&fields=id,title', 'ordering=-due_date&page_size=2'):
+            with patch.object(TaskViewSet, 'fast_list', False):
+                expected = self.client.get(f'/api/tasks/?{query}').content
+            self.assertEqual(self.client.get(f'/api/tasks/?{query}').content, expected)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть только в SQLite')
+class APITaskFilterPlanTests(TestCase):
+    """Каждый фильтр списка задач выполняется по индексу"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='user123')
+        self.factory = APIRequestFactory()
+    
+    def plan(self, query):
+        request = Request(self.factory.get(f'/api/tasks/?{query}'))
+        request.user = self.user
+        queryset = TaskFilter().filter_queryset(request, Task.objects.all(), None)
+        ordering = TaskCursorPagination.ordering
+        return queryset.order_by(*ordering)[:11].explain()
+    
+    def test_filters_use_indexes(self):
+        """Тест планов EXPLAIN QUERY PLAN для поддерживаемых фильтров"""
+        cases = {
+            'status=todo,done': 'task_status_due_idx',
+            'status=todo&due_date_before=2030-01-01': 'task_status_due_idx',
+            'assigned_to=me&status=todo': 'task_assigned_status_idx',
+            'assigned_to=me&priority=high': None,
+            'priority=high': 'task_priority_created_idx',
+            'priority=high,low': 'task_priority_created_idx',
+            'overdue=true': 'task_overdue_idx',
+            'assigned_to=none': None,
+            'project=1&status=todo,review': 'task_project_status_idx',
+            'project=1': None,
+            'due_date_after=2030-01-01&due_date_before=2030-02-01': 'task_due_id_idx',
+        }
+        for query, index in cases.items():
+            plan = self.plan(query)
+            self.assertRegex(plan, r'SEARCH projects_task USING (COVERING )?INDEX', query)
+            if index:
+                self.assertIn(index, plan, query)
+    
+    def test_not_overdue_reads_page_order_index(self):
+        """Тест: ?overdue=false - дополнение частичного индекса, страница читается
+        по индексу сортировки без временной сортировки"""
+        plan = self.plan('overdue=false')
+        self.assertIn('task_created_id_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+    
+    def test_priority_ordering_uses_index(self):
+        """Тест: ?ordering=priority читает индекс ранга без временной сортировки"""
+        for query in ('ordering=priority', 'ordering=-priority'):
+            request = Request(self.factory.get(f'/api/tasks/?{query}'))
+            queryset = KeysetOrderingFilter().filter_queryset(request, Task.objects.all(), TaskViewSet())
+            plan = queryset[:11].explain()
+            self.assertIn('task_priority_rank_idx', plan, query)
+            self.assertNotIn('TEMP B-TREE', plan, query)
+    
+    def test_due_date_ordering_uses_index(self):
+        """Тест: сортировка по сроку читает индекс без временной сортировки"""
+        plan = Task.objects.order_by(F('due_date').asc(nulls_last=True), 'id')[:11].explain()
+        self.assertIn('task_due_id_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+@skipUnless(msgpack is not None, 'пакет msgpack не установлен')
+class APIMessagePackTests(TestCase):
+    """Тесты MessagePack-рендерера и парсера"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.client.force_authenticate(user=self.manager)
+        self.project = Project.objects.create(title='Проект', description='', created_by=self.manager)
+        for i in range(3):
+            Task.objects.create(
+                title=f'Задача {i}', description='', project=self.project,
+                created_by=self.manager, due_date=date(2030, 1, i + 1)
+            )
+    
+    def test_msgpack_matches_json(self):
+        """Тест: данные в MessagePack совпадают с JSON"""
+        for url in ('/api/tasks/', '/api/projects/', '/api/stats/', '/api/changes/'):
+            expected = self.client.get(url).json()
+            response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+            self.assertEqual(response['Content-Type'], 'application/msgpack')
+            self.assertEqual(msgpack.unpackb(response.content), expected, url)
+        response = self.client.get('/api/tasks/?format=msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+    
+    def test_msgpack_request_body(self):
+        """Тест создания задачи из тела MessagePack"""
+        body = msgpack.packb({'title': 'Из msgpack', 'description': 'Описание', 'project': self.project.id})
+        response = self.client.post('/api/tasks/', body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Task.objects.filter(title='Из msgpack').exists())
+        response = self.client.post('/api/tasks/', b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class APIGZipTests(TestCase):
+    """Тесты сжатия ответов API"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.client.force_authenticate(user=self.manager)
+        project = Project.objects.create(title='Проект', description='', created_by=self.manager)
+        for i in range(20):
+            Task.objects.create(title=f'Задача {i}', description='Описание ' * 20, project=project,
+                                created_by=self.manager)
+    
+    def test_large_response_compressed(self):
+        """Тест: большой ответ сжимается, маленький - нет"""
+        plain = self.client.get('/api/tasks/')
+        response = self.client.get('/api/tasks/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content))
+        response = self.client.get('/api/tasks/?fields=id&page_size=1', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+    
+    def test_streaming_response_compressed(self):
+        """Тест: потоковая выгрузка сжимается по частям"""
+        response = self.client.get('/api/tasks/export/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(len(lines), 20)
+    
+    def test_html_not_compressed(self):
+        """Тест: HTML-страницы не сжимаются"""
+        self.client.force_login(self.manager)
+        response = self.client.get('/projects/tasks/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class APIBatchCompleteTests(TestCase):
+    """Тесты пакетного завершения задач"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user('user', password='user123')
+        project = Project.objects.create(title='Проект', description='', created_by=self.manager)
+        self.own = Task.objects.create(title='Своя', description='', project=project,
+                                       created_by=self.manager, assigned_to=self.user)
+        self.done = Task.objects.create(title='Готова', description='', project=project, status='done',
+                                        created_by=self.manager, assigned_to=self.user)
+        self.other = Task.objects.create(title='Чужая', description='', project=project,
+                                         created_by=self.manager, assigned_to=self.manager)
+    
+    def complete(self, ids):
+        return self.client.post('/api/tasks/complete/', {'ids': ids}, format='json')
+    
+    def test_user_completes_only_own_tasks(self):
+        """Тест: пользователь завершает только назначенные ему задачи"""
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(4):
+            # SELECT с проверкой прав, UPDATE и точки сохранения транзакции
+            response = self.complete([self.own.id, self.done.id, self.other.id, 999999])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            'completed': [self.own.id],
+            'already_done': [self.done.id],
+            'forbidden': [self.other.id],
+            'not_found': [999999],
+        })
+        self.own.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.own.status, 'done')
+        self.assertEqual(self.other.status, 'todo')
+    
+    def test_manager_completes_any_task(self):
+        """Тест: менеджер завершает любые задачи"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.complete([self.own.id, self.other.id])
+        self.assertEqual(response.json()['completed'], sorted([self.own.id, self.other.id]))
+        self.assertEqual(Task.objects.filter(status='done').count(), 3)
+    
+    def test_invalid_payload(self):
+        """Тест: некорректный список id дает 400"""
+        self.client.force_authenticate(user=self.manager)
+        for ids in ([], 'abc', [1, 'x'], None):
+            self.assertEqual(self.complete(ids).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 есть только в SQLite')
+class APISearchTests(TestCase):
+    """Тесты полнотекстового поиска /api/search/"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user('user', password='user123')
+        self.project = Project.objects.create(
+            title='Отчеты', description='Квартальный отчет по <script>продажам</script>', created_by=self.manager
+        )
+        self.title_match = Task.objects.create(
+            title='Отчет для клиента', description='Собрать цифры', project=self.project,
+            created_by=self.manager, assigned_to=self.user
+        )
+        self.body_match = Task.objects.create(
+            title='Встреча', description='Обсудить отчет', project=self.project, created_by=self.manager
+        )
+        Comment.objects.create(task=self.body_match, author=self.manager, content='Отчет готов')
+    
+    def search(self, **params):
+        response = self.client.get('/api/search/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.json()
+    
+    def test_ranking_and_highlighting(self):
+        """Тест: совпадение в заголовке выше, совпадения выделены и экранированы"""
+        self.client.force_authenticate(user=self.manager)
+        results = self.search(q='отчет', type='task')['results']
+        self.assertEqual([item['id'] for item in results], [self.title_match.id, self.body_match.id])
+        self.assertEqual(results[0]['title'], '<mark>Отчет</mark> для клиента')
+        self.assertIn('<mark>отчет</mark>', results[1]['snippet'])
+        project = self.search(q='продаж', type='project')['results'][0]
+        self.assertIn('&lt;script&gt;<mark>продажам</mark>&lt;/script&gt;', project['snippet'])
+    
+    def test_visibility(self):
+        """Тест: пользователь находит только свои задачи и комментарии к ним"""
+        self.client.force_authenticate(user=self.user)
+        results = self.search(q='отчет')['results']
+        self.assertEqual(
+            sorted((item['type'], item['id']) for item in results),
+            [('project', self.project.id), ('task', self.title_match.id)]
+        )
+    
+    def test_paging(self):
+        """Тест постраничной выдачи по offset"""
+        self.client.force_authenticate(user=self.manager)
+        first = self.search(q='отчет', page_size=2)
+        self.assertEqual(len(first['results']), 2)
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 2)
+        self.assertIsNone(second['next'])
+        seen = {(item['type'], item['id']) for item in first['results'] + second['results']}
+        self.assertEqual(len(seen), 4)
+    
+    def test_invalid_requests(self):
+        """Тест: пустой запрос и неизвестный тип дают 400"""
+        self.client.force_authenticate(user=self.manager)
+        for query in ({'q': ''}, {'q': '"*'}, {'q': 'отчет', 'type': 'user'}, {'q': 'отчет', 'page_size': 'x'}):
+            response = self.client.get('/api/search/', query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+
+class APITaskCommentsTests(TestCase):
+    """Тесты комментариев задачи /api/tasks/{id}/comments/"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user('user', password='user123')
+        project = Project.objects.create(title='Проект', description='', created_by=self.manager)
+        self.task = Task.objects.create(title='Задача', description='', project=project, created_by=self.manager)
+        self.other = Task.objects.create(title='Другая', description='', project=project, created_by=self.manager)
+        self.comments = [
+            Comment.objects.create(task=self.task, author=self.user, content=f'Комментарий {i}') for i in range(7)
+        ]
+        Comment.objects.create(task=self.other, author=self.user, content='Чужой')
+    
+    def test_pages_task_comments(self):
+        """Тест обхода комментариев задачи по курсору"""
+        self.client.force_authenticate(user=self.manager)
+        url, seen = f'/api/tasks/{self.task.id}/comments/?page_size=3', []
+        while url:
+            with self.assertNumQueries(2):
+                # Видимость задачи и страница комментариев с авторами
+                data = self.client.get(url).json()
+            seen.extend(comment['id'] for comment in data['results'])
+            url = data['next']
+        self.assertEqual(seen, [comment.id for comment in reversed(self.comments)])
+        first = self.client.get(f'/api/tasks/{self.task.id}/comments/?fields=id,author_name').json()['results'][0]
+        self.assertEqual(first, {'id': self.comments[-1].id, 'author_name': 'user'})
+    
+    def test_invisible_task(self):
+        """Тест: комментарии недоступной задачи - 404"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(f'/api/tasks/{self.task.id}/comments/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.task.assigned_to = self.user
+        self.task.save()
+        response = self.client.get(f'/api/tasks/{self.task.id}/comments/')
+        self.assertEqual(len(response.json()['results']), 7)
+    
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть только в SQLite')
+    def test_uses_task_created_index(self):
+        """Тест: страница читается по индексу (task, created_at, id) без сортировки"""
+        plan = Comment.objects.filter(task=self.task).order_by('-created_at', '-id')[:11].explain()
+        self.assertIn('comment_task_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class APIFragmentCacheTests(TestCase):
+    """Кэш фрагментов шаблонов и пакетные операции API"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123', is_staff=True)
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.project = Project.objects.create(title='Проект', description='', created_by=self.manager)
+        self.task = Task.objects.create(title='Задача', description='', project=self.project, created_by=self.manager)
+    
+    def test_batch_complete_invalidates_project_card(self):
+        """Тест: пакетное завершение обновляет карточку проекта"""
+        self.client.force_login(self.manager)
+        self.assertContains(self.client.get('/projects/'), 'открыто: 1, выполнено: 0')
+        self.client.force_authenticate(user=self.manager)
+        self.client.post('/api/tasks/complete/', {'ids': [self.task.pk]}, format='json')
+        self.assertContains(self.client.get('/projects/'), 'открыто: 0, выполнено: 1')
+    
+    def test_stats_endpoint(self):
+        """Тест: счетчики кэша фрагментов доступны только администраторам"""
+        self.client.force_login(self.manager)
+        self.client.get('/projects/')
+        self.client.force_authenticate(user=self.manager)
+        self.assertIn('project_card', self.client.get('/api/fragment-cache/').json())
+        self.assertEqual(self.client.delete('/api/fragment-cache/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get('/api/fragment-cache/').json(), {})
+        self.manager.is_staff = False
+        self.manager.save()
+        self.assertEqual(self.client.get('/api/fragment-cache/').status_code, status.HTTP_403_FORBIDDEN)
+
+class APIOverdueTests(TestCase):
+    """Просрочка задач в API: поле is_overdue и фильтр ?overdue="""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.project = Project.objects.create(title='Проект', description='', created_by=self.manager)
+        self.late = Task.objects.create(
+            title='Просрочена', description='', project=self.project, created_by=self.manager,
+            due_date=date.today() - timedelta(days=1)
+        )
+        self.later = Task.objects.create(
+            title='В срок', description='', project=self.project, created_by=self.manager,
+            due_date=date.today() + timedelta(days=1)
+        )
+        self.client.force_authenticate(user=self.manager)
+    
+    def test_overdue_filter(self):
+        """Тест: ?overdue=true и ?overdue=false"""
+        data = self.client.get('/api/tasks/', {'overdue': 'true'}).json()
+        self.assertEqual([task['id'] for task in data['results']], [self.late.pk])
+        self.assertTrue(data['results'][0]['is_overdue'])
+        data = self.client.get('/api/tasks/', {'overdue': 'false'}).json()
+        self.assertEqual([task['id'] for task in data['results']], [self.later.pk])
+        self.assertFalse(data['results'][0]['is_overdue'])
+        response = self.client.get('/api/tasks/', {'overdue': 'maybe'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_is_overdue_in_detail_and_nested(self):
+        """Тест: is_overdue в деталях задачи и во вложенных задачах проекта"""
+        self.assertTrue(self.client.get(f'/api/tasks/{self.late.pk}/').json()['is_overdue'])
+        data = self.client.get(f'/api/projects/{self.project.pk}/').json()
+        self.assertEqual(
+            {task['id']: task['is_overdue'] for task in data['tasks']},
+            {self.late.pk: True, self.later.pk: False}
+        )
+    
+    def test_etag_changes_when_task_becomes_overdue(self):
+        """Тест: ETag меняется, когда задача становится просроченной без изменения updated_at"""
+        etag = self.client.get('/api/tasks/')['ETag']
+        Task.objects.filter(pk=self.later.pk).update(due_date=date.today() - timedelta(days=2))
+        response = self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+class APIQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Бюджеты запросов эндпоинтов API"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manager = User.objects.create_user('manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        for i in range(4):
+            self.project = Project.objects.create(title=f'Проект {i}', description='', created_by=self.manager)
+            self.task = Task.objects.create(
+                title=f'Задача {i}', description='', project=self.project,
+                created_by=self.manager, assigned_to=self.manager
+            )
+            Comment.objects.create(task=self.task, author=self.manager, content='Комментарий')
+        self.client.force_authenticate(user=self.manager)
+    
+    def test_list_and_detail_budget(self):
+        """Тест: списки и детали API без N+1"""
+        self.assertQueryBudget('project-list')
+        self.assertQueryBudget('project-detail', args=[self.project.pk])
+        self.assertQueryBudget('task-list', data={'expand': 'project,assigned_to'})
+        self.assertQueryBudget('task-detail', args=[self.task.pk])
+        self.assertQueryBudget('comment-list')
+    
+    def test_aggregate_endpoints_budget(self):
+        """Тест: сводные эндпоинты укладываются в бюджет запросов"""
+        self.assertQueryBudget('api_stats')
+        self.assertQueryBudget('api_dashboard')
+        self.assertQueryBudget('api_changes')
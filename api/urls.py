@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken.views import obtain_auth_token
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'users', views.UserViewSet)
@@ -11,6 +11,16 @@ router.register(r'comments', views.CommentViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('changes/', views.changes, name='api_changes'),
+    path('stats/', views.stats, name='api_stats'),
+    path('dashboard/', views.dashboard, name='api_dashboard'),
+    path('search/', views.search, name='api_search'),
+    path('fragment-cache/', views.fragment_cache_stats, name='api_fragment_cache'),
+    path('async/tasks/', async_views.task_list, name='api_async_task_list'),
+    path('async/tasks/<int:pk>/', async_views.task_detail, name='api_async_task_detail'),
+    path('async/projects/', async_views.project_list, name='api_async_project_list'),
+    path('async/projects/<int:pk>/', async_views.project_detail, name='api_async_project_detail'),
+    path('async/comments/', async_views.comment_list, name='api_async_comment_list'),
     path('auth/register/', views.register, name='api_register'),
     path('auth/login/', views.login, name='api_login'),
     path('auth/token/', obtain_auth_token, name='api_token_auth'),
@@ -1,63 +1,455 @@
+import csv
+import hashlib
+import json
+from datetime import datetime, timedelta
+
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.permissions import AllowAny
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from projects.models import Project, Task, Comment
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
+from django.utils.http import http_date
+from accounts.roles import role_of
+from projects.dashboard import cached_dashboard
+from projects.fragments import bump_fragment_versions, fragment_stats, reset_fragment_stats
+from projects.models import Project, Task, Comment, Tombstone, record_unassignments
+from projects.search import SEARCH_KINDS, find_matches, match_query, search_available
+from projects.stats import bump_data_version, cached_task_stats, stats_scope
+from .filters import KeysetOrderingFilter, TaskFilter
+from .pagination import TaskCursorPagination, CommentCursorPagination
 from .serializers import (
     UserSerializer, ProjectSerializer, TaskSerializer,
-    CommentSerializer, UserRegistrationSerializer
+    CommentSerializer, UserRegistrationSerializer, TaskBulkSerializer,
+    parse_field_spec
 )
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+
+def _as_id(value):
+    """Приводит id из JSON к int; для некорректных значений возвращает None"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+class _Echo:
+    """Псевдо-буфер для csv.writer: write() возвращает строку, а не пишет ее"""
+    
+    def write(self, value):
+        return value
+
+def _collect_ids(operations, field):
+    """id поля field из data всех операций пакета"""
+    ids = set()
+    for operation in operations:
+        data = operation.get('data') if isinstance(operation, dict) else None
+        if isinstance(data, dict) and _as_id(data.get(field)) is not None:
+            ids.add(_as_id(data.get(field)))
+    return ids
+
+def _project_rows(queryset):
+    """Плоские строки проектов с именами полей как в ProjectSerializer"""
+    return queryset.values(
+        'id', 'title', 'description', 'status', 'created_by', 'created_at', 'updated_at',
+        created_by_name=F('created_by__username'),
+    )
+
+def _task_rows(queryset):
+    """Плоские строки задач с именами полей как в TaskSerializer, без комментариев"""
+    return queryset.values(
+        'id', 'title', 'description', 'project', 'assigned_to', 'priority',
+        'status', 'due_date', 'created_by', 'created_at', 'updated_at',
+        project_title=F('project__title'),
+        assigned_to_name=F('assigned_to__username'),
+        created_by_name=F('created_by__username'),
+    )
+
+def _comment_rows(queryset):
+    """Плоские строки комментариев с задачей, к которой они относятся"""
+    return queryset.values(
+        'id', 'task', 'author', 'content', 'created_at', 'updated_at',
+        author_name=F('author__username'),
+    )
+
+def _tombstone_rows(queryset):
+    return queryset.values('id', 'model', 'object_id', 'reason', 'deleted_at')
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAdminUser]
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class SparseFieldsViewSetMixin:
+    """Выборочные поля ?fields= / ?expand= для чтения.
+    
+    Одно и то же дерево полей обрезает вывод сериализатора и план загрузки
+    queryset'а, поэтому незапрошенные связи и колонки не читаются из базы.
+    """
+    
+    def get_field_spec(self):
+        if self.request is None or self.request.method not in permissions.SAFE_METHODS:
+            return None
+        params = self.request.query_params
+        return parse_field_spec(params.get('fields'), params.get('expand'))
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['field_spec'] = self.get_field_spec()
+        return context
+    
+    def get_ordering_columns(self):
+        """Колонки сортировки пагинатора, с учетом ?ordering= фильтра сортировки"""
+        ordering = getattr(self.pagination_class, 'ordering', ())
+        for backend in self.filter_backends:
+            if hasattr(backend, 'get_ordering') and self.request is not None:
+                ordering = backend().get_ordering(self.request, None, self)
+                break
+        return [field.lstrip('-') for field in ordering]
+    
+    def setup_eager_loading(self, queryset):
+        # Колонки сортировки пагинатора нужны всегда, иначе курсор догружает их запросом
+        return self.get_serializer_class().setup_eager_loading(
+            queryset, self.get_field_spec(), columns=self.get_ordering_columns()
+        )
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для list/retrieve по updated_at.
+    
+    Валидаторы считаются одним агрегатным запросом (число строк и
+    MAX(updated_at) по выводимым моделям) только над строками отдаваемой
+    страницы (для retrieve - над одним объектом), поэтому их стоимость не
+    зависит от размера выборки. Обычный GET получает валидаторы после
+    выборки страницы; при If-None-Match или If-Modified-Since сначала
+    выбираются только id страницы, и при совпадении отвечаем 304 без
+    выборки строк и сериализации.
+    """
+    
+    def is_conditional(self):
+        meta = self.request.META
+        return 'HTTP_IF_NONE_MATCH' in meta or 'HTTP_IF_MODIFIED_SINCE' in meta
+    
+    def get_validators(self, queryset, require_rows=False, ids=None):
+        aggregates = self.get_serializer_class().validator_aggregates(self.get_field_spec())
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+        values = queryset.order_by().aggregate(**aggregates)
+        if require_rows and not values['count']:
+            return None, None
+        timestamps = [value for value in values.values() if hasattr(value, 'timestamp')]
+        last_modified = int(max(timestamps).timestamp()) if timestamps else None
+        # Представление зависит от параметров запроса, пользователя и формата ответа
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        parts = [
+            self.request.get_full_path(),
+            str(self.request.user.pk),
+            getattr(renderer, 'format', ''),
+        ] + [f'{key}={values[key]}' for key in sorted(values)]
+        if ids is not None:
+            # Состав и порядок страницы
+            parts.append(','.join(str(pk) for pk in ids))
+        etag = quote_etag(hashlib.sha1('|'.join(parts).encode()).hexdigest())
+        return 'W/' + etag, last_modified
+    
+    def set_validators(self, response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ['Authorization'])
+        return response
+    
+    def conditional_response(self, queryset, handler, *args, require_rows=False, **kwargs):
+        etag, last_modified = self.get_validators(queryset, require_rows)
+        if etag is None:
+            # Объект не найден или недоступен: пусть обработчик вернет 404
+            return handler(self.request, *args, **kwargs)
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(self.request, *args, **kwargs)
+        return self.set_validators(response, etag, last_modified)
+    
+    def page_ids(self, queryset):
+        """id строк страницы, которую отдаст list(), без выборки самих строк"""
+        paginator = self.pagination_class()
+        rows = paginator.paginate_queryset(
+            queryset.values('id', *self.get_ordering_columns()), self.request, view=self
+        )
+        return [row['id'] for row in rows]
+    
+    def list(self, request, *args, **kwargs):
+        if self.paginator is None:
+            return super().list(request, *args, **kwargs)
+        # Тот же порядок, что у страницы из FastListMixin.list
+        queryset = self.filter_queryset(self.get_base_queryset().order_by('pk'))
+        if self.is_conditional():
+            etag, last_modified = self.get_validators(
+                self.get_base_queryset(), ids=self.page_ids(queryset)
+            )
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return self.set_validators(response, etag, last_modified)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            ids = [row['id'] if isinstance(row, dict) else row.pk for row in self.paginator.page]
+            etag, last_modified = self.get_validators(self.get_base_queryset(), ids=ids)
+            self.set_validators(response, etag, last_modified)
+        return response
+    
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.get_base_queryset().filter(**{self.lookup_field: kwargs[lookup]})
+        except (TypeError, ValueError, ValidationError):
+            # Некорректный id: get_object() сам вернет 404
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(queryset, super().retrieve, *args, require_rows=True, **kwargs)
+
+class FastListMixin:
+    """Быстрый путь list() без ModelSerializer.
+    
+    Строки values() сразу превращаются в словари (fast_representation),
+    JSON совпадает с выводом сериализатора байт-в-байт. Отключается
+    атрибутом fast_list = False.
+    """
+    fast_list = True
+    
+    def list(self, request, *args, **kwargs):
+        if not self.fast_list:
+            return super().list(request, *args, **kwargs)
+        serializer_class = self.get_serializer_class()
+        spec = self.get_field_spec()
+        queryset = serializer_class.values_queryset(
+            self.filter_queryset(self.get_base_queryset().order_by('pk')), spec,
+            columns=self.get_ordering_columns()
+        )
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset) if page is None else page
+        data = serializer_class.fast_representation(rows, spec)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+class ProjectViewSet(ConditionalGetMixin, FastListMixin, SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
     
-    def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'userprofile'):
-            if user.userprofile.is_admin() or user.userprofile.is_manager():
-                return Project.objects.all()
+    def get_base_queryset(self):
+        # Все роли видят все проекты
         return Project.objects.all()
     
+    def get_queryset(self):
+        return self.setup_eager_loading(self.get_base_queryset().order_by('pk'))
+    
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
     
     def perform_destroy(self, instance):
-        if not self.request.user.userprofile.is_admin():
+        if not role_of(self.request.user).is_admin:
             raise permissions.PermissionDenied("Только администраторы могут удалять проекты")
         instance.delete()
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ConditionalGetMixin, FastListMixin, SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
+    pagination_class = TaskCursorPagination
+    filter_backends = [TaskFilter, KeysetOrderingFilter]
+    ordering_fields = ['created_at', 'due_date', 'priority']
+    ordering_columns = {'priority': 'priority_rank'}
+    ordering = TaskCursorPagination.ordering
+    
+    def get_base_queryset(self):
+        return Task.objects.visible_to(self.request.user)
     
     def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'userprofile'):
-            if user.userprofile.is_admin() or user.userprofile.is_manager():
-                return Task.objects.all()
-            else:
-                return Task.objects.filter(assigned_to=user)
-        return Task.objects.none()
+        return self.setup_eager_loading(self.get_base_queryset().order_by('pk'))
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Пакетное создание, изменение и удаление задач в одной транзакции.
+        
+        Тело запроса: {"operations": [{"op": "create", "data": {...}},
+                                      {"op": "update", "id": 1, "data": {...}},
+                                      {"op": "delete", "id": 2}]}
+        Операции проверяются вместе; при любой ошибке ничего не записывается.
+        Изменять и удалять можно только задачи из get_base_queryset(), как и
+        в update/destroy.
+        """
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return Response(
+                {"error": "Ожидается непустой список operations"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(operations) > settings.API_BULK_MAX_OPERATIONS:
+            return Response(
+                {"error": f"Не более {settings.API_BULK_MAX_OPERATIONS} операций за запрос"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        with transaction.atomic():
+            # Задачи и связанные объекты загружаются одним запросом на модель
+            visible = self.get_base_queryset()
+            target_ids = [
+                _as_id(operation.get('id')) for operation in operations
+                if isinstance(operation, dict) and operation.get('op') in ('update', 'delete')
+            ]
+            targets = visible.select_for_update().in_bulk([pk for pk in target_ids if pk is not None])
+            context = self.get_serializer_context()
+            context['related_objects'] = {
+                Project: Project.objects.in_bulk(_collect_ids(operations, 'project')),
+                User: User.objects.in_bulk(_collect_ids(operations, 'assigned_to')),
+            }
+            
+            validated, errors, seen = [], [], set()
+            for index, operation in enumerate(operations):
+                op = operation.get('op') if isinstance(operation, dict) else None
+                if op not in ('create', 'update', 'delete'):
+                    errors.append({'index': index, 'errors': {'op': ['Неизвестная операция']}})
+                    continue
+                instance = None
+                if op != 'create':
+                    instance = targets.get(_as_id(operation.get('id')))
+                    if instance is None:
+                        errors.append({'index': index, 'errors': {'id': ['Задача не найдена']}})
+                        continue
+                    if instance.pk in seen:
+                        errors.append({'index': index, 'errors': {'id': ['Задача уже есть в пакете']}})
+                        continue
+                    seen.add(instance.pk)
+                if op == 'delete':
+                    validated.append((op, instance, None))
+                    continue
+                serializer = TaskBulkSerializer(
+                    instance, data=operation.get('data', {}),
+                    partial=(op == 'update'), context=context
+                )
+                if serializer.is_valid():
+                    validated.append((op, instance, serializer.validated_data))
+                else:
+                    errors.append({'index': index, 'errors': serializer.errors})
+            if errors:
+                return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # bulk_update не заполняет auto_now, поэтому updated_at ставим сами
+            now = timezone.now()
+            created, updated, deleted = [], [], []
+            touched_projects = set()
+            update_fields = {'updated_at'}
+            for op, instance, data in validated:
+                if op == 'create':
+                    created.append(Task(created_by=request.user, **data))
+                elif op == 'update':
+                    touched_projects.add(instance.project_id)
+                    for field, value in data.items():
+                        setattr(instance, field, value)
+                    instance.updated_at = now
+                    update_fields.update(data)
+                    updated.append(instance)
+                else:
+                    deleted.append(instance.pk)
+            # Ранг приоритета обычно ставит Task.save()
+            for task in created + updated:
+                task.sync_priority_rank()
+            if 'priority' in update_fields:
+                update_fields.add('priority_rank')
+            
+            Task.objects.bulk_create(created)
+            if updated:
+                Task.objects.bulk_update(updated, sorted(update_fields))
+                record_unassignments(updated)
+            if created or updated:
+                # bulk_create и bulk_update не отправляют post_save
+                bump_data_version()
+                touched_projects.update(task.project_id for task in created + updated)
+                bump_fragment_versions('project', touched_projects)
+            if deleted:
+                visible.filter(pk__in=deleted).delete()
+        
+        created_tasks = iter(created)
+        results = []
+        for op, instance, data in validated:
+            task = next(created_tasks) if op == 'create' else instance
+            results.append({'op': op, 'id': task.pk, 'status': op + 'd'})
+        return Response({'results': results})
+    
+    # Колонки выгрузки: имена совпадают с полями TaskSerializer
+    EXPORT_FIELDS = [
+        'id', 'title', 'description', 'project', 'project_title',
+        'assigned_to', 'assigned_to_name', 'priority', 'status',
+        'due_date', 'created_by', 'created_by_name', 'created_at', 'updated_at'
+    ]
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Потоковая выгрузка задач в NDJSON (?output=ndjson) или CSV (?output=csv).
+        
+        Строки читаются через values().iterator() порциями по
+        API_EXPORT_CHUNK_SIZE, поэтому память не растет с числом задач.
+        Фильтр по проекту - ?project=<id>; видимость задач - как в get_queryset.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in ('ndjson', 'csv'):
+            return Response(
+                {"error": "output должен быть ndjson или csv"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = self.get_base_queryset()
+        project = request.query_params.get('project')
+        if project is not None:
+            if _as_id(project) is None:
+                return Response(
+                    {"error": "Некорректный id проекта"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            queryset = queryset.filter(project=_as_id(project))
+        rows = _task_rows(queryset.order_by('pk')).iterator(chunk_size=settings.API_EXPORT_CHUNK_SIZE)
+        
+        if output == 'csv':
+            writer = csv.writer(_Echo())
+            content = (
+                writer.writerow(row)
+                for row in self._export_csv_rows(rows)
+            )
+            response = StreamingHttpResponse(content, content_type='text/csv; charset=utf-8')
+        else:
+            content = (
+                json.dumps(
+                    {field: row[field] for field in self.EXPORT_FIELDS},
+                    cls=DjangoJSONEncoder, ensure_ascii=False
+                ) + '\n'
+                for row in rows
+            )
+            response = StreamingHttpResponse(content, content_type='application/x-ndjson; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="tasks.{output}"'
+        return response
+    
+    def _export_csv_rows(self, rows):
+        yield self.EXPORT_FIELDS
+        for row in rows:
+            yield [row[field] for field in self.EXPORT_FIELDS]
+    
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
         task = self.get_object()
         user = request.user
         
-        if hasattr(user, 'userprofile') and user.userprofile.is_user() and task.assigned_to != user:
+        if role_of(user).is_user and task.assigned_to != user:
             return Response(
                 {"error": "Вы не можете завершить эту задачу"},
                 status=status.HTTP_403_FORBIDDEN
@@ -69,13 +461,265 @@ class TaskViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(task)
         return Response(serializer.data)
 
-class CommentViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def comments(self, request, pk=None):
+        """Комментарии задачи по keyset-пагинации (-created_at, -id).
+        
+        Видимость задачи проверяется один раз, затем страница читается одним
+        запросом по индексу comment_task_created_idx вместе с автором.
+        Поддерживает ?fields=, ?cursor= и ?page_size=.
+        """
+        pk = _as_id(pk)
+        if pk is None or not self.get_base_queryset().filter(pk=pk).exists():
+            raise NotFound()
+        spec = self.get_field_spec()
+        paginator = CommentCursorPagination()
+        queryset = CommentSerializer.values_queryset(
+            Comment.objects.filter(task_id=pk), spec,
+            columns=[field.lstrip('-') for field in paginator.ordering]
+        )
+        page = paginator.paginate_queryset(queryset, request)
+        return paginator.get_paginated_response(CommentSerializer.fast_representation(page, spec))
+    
+    @action(detail=False, methods=['post'], url_path='complete')
+    def complete_batch(self, request):
+        """Завершение нескольких задач: {"ids": [1, 2, 3]}.
+        
+        Права - как у complete: пользователи завершают только назначенные им
+        задачи. Задачи меняются одним UPDATE; в ответе id, разложенные на
+        completed, already_done, forbidden и not_found.
+        """
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not ids or any(_as_id(pk) is None for pk in ids):
+            return Response(
+                {"error": "Ожидается непустой список id задач в ids"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(ids) > settings.API_BULK_MAX_OPERATIONS:
+            return Response(
+                {"error": f"Не более {settings.API_BULK_MAX_OPERATIONS} задач за запрос"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ids = {_as_id(pk) for pk in ids}
+        
+        with transaction.atomic():
+            completable = Task.objects.completable_by(request.user).filter(pk__in=ids)
+            rows = Task.objects.select_for_update().filter(pk__in=ids).annotate(
+                allowed=Exists(completable.filter(pk=OuterRef('pk')))
+            ).values_list('id', 'status', 'allowed', 'project_id')
+            result = {'completed': [], 'already_done': [], 'forbidden': [], 'not_found': []}
+            found, projects = set(), set()
+            for pk, task_status, allowed, project_id in rows:
+                found.add(pk)
+                if not allowed:
+                    result['forbidden'].append(pk)
+                elif task_status == 'done':
+                    result['already_done'].append(pk)
+                else:
+                    result['completed'].append(pk)
+                    projects.add(project_id)
+            result['not_found'] = sorted(ids - found)
+            if result['completed']:
+                completable.filter(pk__in=result['completed']).update(status='done', updated_at=timezone.now())
+                # update() не отправляет post_save
+                bump_data_version()
+                bump_fragment_versions('project', projects)
+        
+        return Response({key: sorted(value) for key, value in result.items()})
+
+class CommentViewSet(ConditionalGetMixin, SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    pagination_class = CommentCursorPagination
+    
+    def get_base_queryset(self):
+        return Comment.objects.all()
+    
+    def get_queryset(self):
+        return self.setup_eager_loading(self.get_base_queryset().order_by('pk'))
     
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+# v2: окно пересмотра вместо позиции (время, id); старые watermark не принимаются
+CHANGES_SALT = 'api.changes.v2'
+
+def _change_streams(user):
+    """Потоки ленты изменений: ключ ответа -> (queryset, поле времени, строки)"""
+    tombstones = Tombstone.objects.all()
+    if role_of(user).can_manage:
+        # Менеджеры видят все задачи, снятие назначения для них не удаление
+        tombstones = tombstones.exclude(reason='unassigned')
+    else:
+        # Задача, назначенная пользователю снова, приходит в tasks, а не в deleted
+        tombstones = tombstones.filter(~Q(model='task') | Q(assigned_to_id=user.pk)).exclude(
+            reason='unassigned', object_id__in=Task.objects.filter(assigned_to=user).values('id')
+        )
+    return {
+        'projects': (Project.objects.all(), 'updated_at', _project_rows),
+        'tasks': (Task.objects.visible_to(user), 'updated_at', _task_rows),
+        'comments': (Comment.objects.all(), 'updated_at', _comment_rows),
+        'deleted': (tombstones, 'deleted_at', _tombstone_rows),
+    }
+
+def _changes_bound(now):
+    """Нижняя граница окна пересмотра ленты: время строк ставится до коммита
+    транзакции, поэтому строка с меньшим временем может стать видна позже"""
+    return now.replace(microsecond=0) - timedelta(seconds=settings.API_CHANGES_LAG_SECONDS)
+
+def _seen_q(time_field, seen):
+    """Условие для уже отданных строк окна: пары (время, id)"""
+    condition = Q(pk__in=[])
+    for timestamp, pk in seen:
+        condition |= Q(**{time_field: datetime.fromisoformat(timestamp), 'id': pk})
+    return condition
+
+@api_view(['GET'])
+def changes(request):
+    """Лента изменений для клиентов синхронизации.
+    
+    GET /api/changes/ без параметров возвращает только watermark - его нужно
+    получить до полной загрузки данных. GET /api/changes/?since=<watermark>
+    возвращает проекты, задачи и комментарии, измененные после watermark, и
+    записи об удалениях (deleted), а также новый watermark. Если has_more,
+    запрос нужно повторить с новым watermark.
+    
+    Время изменения ставится до коммита, поэтому строка может появиться
+    позже строки с большим временем. Watermark хранит по каждому потоку
+    границу окна API_CHANGES_LAG_SECONDS секунд до последнего изменения и
+    пары (время, id) уже отданных строк окна: строки окна перечитываются
+    по индексу (updated_at, id), отданные ранее пропускаются.
+    
+    В deleted попадают и задачи, снятые с пользователя (reason=unassigned).
+    Записи об удалениях хранятся API_CHANGES_RETENTION_DAYS дней, поэтому
+    на watermark старше этого срока ответ 410 - нужна полная синхронизация.
+    """
+    streams = _change_streams(request.user)
+    data = {key: [] for key in streams}
+    since = request.query_params.get('since')
+    # Строки, которые еще могут быть не закоммичены, имеют время не раньше bound
+    bound = _changes_bound(timezone.now())
+    
+    if since is None:
+        positions = {}
+        for key, (queryset, time_field, rows) in streams.items():
+            seen = queryset.filter(**{f'{time_field}__gte': bound}).values_list(time_field, 'id')
+            positions[key] = [bound.isoformat(), [[timestamp.isoformat(), pk] for timestamp, pk in seen]]
+        return Response({
+            'watermark': signing.dumps(positions, salt=CHANGES_SALT, compress=True), 'has_more': False, **data
+        })
+    
+    try:
+        # Время подписи - момент выдачи watermark: записи об удалениях после
+        # него могли быть удалены prune_tombstones, если он старше срока хранения
+        positions = signing.loads(since, salt=CHANGES_SALT, max_age=Tombstone.retention())
+    except signing.SignatureExpired:
+        return Response(
+            {'error': 'Watermark устарел, нужна полная синхронизация'},
+            status=status.HTTP_410_GONE
+        )
+    except signing.BadSignature:
+        return Response(
+            {'error': 'Некорректный watermark, нужна полная синхронизация'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    limit = settings.API_CHANGES_MAX_ROWS
+    has_more = False
+    for key, (queryset, time_field, rows) in streams.items():
+        stream_bound, seen = positions[key]
+        stream_bound = datetime.fromisoformat(stream_bound)
+        queryset = queryset.filter(**{f'{time_field}__gte': stream_bound}).exclude(_seen_q(time_field, seen))
+        batch = list(rows(queryset.order_by(time_field, 'id'))[:limit + 1])
+        if len(batch) > limit:
+            # Непрочитанные строки не раньше последней отданной
+            has_more = True
+            batch = batch[:limit]
+            stream_bound = max(stream_bound, _changes_bound(batch[-1][time_field]))
+        else:
+            stream_bound = max(stream_bound, bound)
+        seen += [[row[time_field].isoformat(), row['id']] for row in batch]
+        positions[key] = [
+            stream_bound.isoformat(),
+            [pair for pair in seen if datetime.fromisoformat(pair[0]) >= stream_bound]
+        ]
+        data[key] = batch
+    
+    return Response({
+        'watermark': signing.dumps(positions, salt=CHANGES_SALT, compress=True), 'has_more': has_more, **data
+    })
+
+@api_view(['GET'])
+def stats(request):
+    """Счетчики видимых пользователю задач по статусам, приоритетам,
+    проектам и просроченные - один запрос с GROUP BY, результат кэшируется"""
+    queryset = Task.objects.visible_to(request.user)
+    return Response(cached_task_stats(queryset, stats_scope(request.user)))
+
+@api_view(['GET'])
+def dashboard(request):
+    """Все данные главной страницы за один запрос: мои задачи, просроченные,
+    счетчики по статусам, последние комментарии и активные проекты"""
+    return Response(cached_dashboard(request.user))
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([permissions.IsAdminUser])
+def fragment_cache_stats(request):
+    """Попадания и промахи кэша фрагментов шаблонов в этом процессе;
+    DELETE обнуляет счетчики"""
+    if request.method == 'DELETE':
+        reset_fragment_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(fragment_stats())
+
+@api_view(['GET'])
+def search(request):
+    """Полнотекстовый поиск по проектам, задачам и комментариям (FTS5).
+    
+    ?q=текст - слова ищутся все сразу, последнее по префиксу;
+    ?type=task,project,comment - ограничить типы; ?page_size=, ?offset=.
+    Результаты отсортированы по релевантности (bm25), title и snippet -
+    экранированный HTML с совпадениями в <mark>. Задачи и комментарии к
+    ним - только видимые пользователю, как в /api/tasks/.
+    """
+    if not search_available():
+        return Response(
+            {"error": "Полнотекстовый поиск поддерживается только для SQLite"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    query = match_query(request.query_params.get('q'))
+    if query is None:
+        return Response({"error": "Укажите текст запроса в q"}, status=status.HTTP_400_BAD_REQUEST)
+    kinds = [kind for value in request.query_params.getlist('type') for kind in value.split(',') if kind]
+    if any(kind not in SEARCH_KINDS for kind in kinds):
+        return Response(
+            {"error": f"type: допустимые значения {', '.join(SEARCH_KINDS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        limit = min(int(request.query_params.get('page_size', settings.REST_FRAMEWORK['PAGE_SIZE'])),
+                    settings.API_CURSOR_MAX_PAGE_SIZE)
+        offset = int(request.query_params.get('offset', 0))
+    except ValueError:
+        limit, offset = -1, -1
+    if limit < 1 or offset < 0:
+        return Response({"error": "page_size и offset должны быть числами"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if role_of(request.user).can_manage:
+        tasks = comments = None
+    else:
+        tasks = Task.objects.visible_to(request.user)
+        comments = Comment.objects.filter(task__in=tasks)
+    scopes = {'project': None, 'task': tasks, 'comment': comments}
+    scopes = {kind: scopes[kind] for kind in (kinds or SEARCH_KINDS)}
+    
+    results = find_matches(query, scopes, limit + 1, offset)
+    next_url = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
+    return Response({'next': next_url, 'results': results})
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register(request):
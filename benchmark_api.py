@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+"""
+Бенчмарки API ProjectFlow на временной базе в памяти
+
+    python benchmark_api.py serializers --tasks 5000
+    python benchmark_api.py asgi --concurrency 500 --delay 0.01 --workers 8
+    python benchmark_api.py renderers --tasks 5000
+
+Для asgi нужен пакет uvicorn (pip install uvicorn), без него измеряется
+только WSGI.
+"""
+
+import argparse
+import asyncio
+import gzip
+import importlib.util
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project_manager.settings')
+
+# Порция чтения и размер буфера приема медленного клиента (asgi), байт
+READ_CHUNK = 4096
+# Буфер отправки серверов (asgi), байт: одинаковый для WSGI и ASGI, чтобы
+# ответ не уходил целиком в буфер ядра и медленное чтение занимало сервер
+SERVER_SNDBUF = 16384
+
+
+def create_data(projects, tasks_per_project, comments_per_task):
+    """Создает тестовые данные пачками"""
+    from django.contrib.auth.models import User
+    from projects.models import Project, Task, Comment
+
+    manager = User.objects.create_user('bench_manager', password='bench123')
+    manager.userprofile.role = 'manager'
+    manager.userprofile.save()
+    user = User.objects.create_user('bench_user', password='bench123')
+
+    project_objs = Project.objects.bulk_create([
+        Project(title=f'Проект {i}', description='Описание проекта ' * 10, created_by=manager)
+        for i in range(projects)
+    ])
+    task_objs = Task.objects.bulk_create([
+        Task(
+            title=f'Задача {i}-{j}', description='Описание задачи ' * 20, project=project,
+            assigned_to=user if j % 2 else None, created_by=manager, priority='high',
+            priority_rank=Task.PRIORITY_RANKS['high'], status='todo'
+        )
+        for i, project in enumerate(project_objs)
+        for j in range(tasks_per_project)
+    ])
+    Comment.objects.bulk_create([
+        Comment(task=task, author=user, content=f'Комментарий {k}')
+        for task in task_objs
+        for k in range(comments_per_task)
+    ])
+    return manager, user
+
+
+def measure(label, rows, func, repeat, unit='строк'):
+    """Лучшее время из repeat запусков, единиц unit в секунду"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"   {label:<32} {best * 1000:9.1f} мс   {rows / best:12,.0f} {unit}/с")
+    return result
+
+
+def bench_serializers(args):
+    """ModelSerializer против быстрого пути values() для списков задач и проектов"""
+    from rest_framework.renderers import JSONRenderer
+    from api.serializers import ProjectSerializer, TaskSerializer
+    from projects.models import Project, Task
+
+    projects = max(1, args.tasks // 20)
+    create_data(projects, 20, args.comments)
+    renderer = JSONRenderer()
+
+    for serializer_class, model in ((TaskSerializer, Task), (ProjectSerializer, Project)):
+        rows = model.objects.count()
+        print(f"\n{serializer_class.__name__}: {rows} строк")
+
+        def serializer_path():
+            queryset = serializer_class.setup_eager_loading(model.objects.order_by('pk'))
+            return renderer.render(serializer_class(queryset, many=True).data)
+
+        def fast_path():
+            queryset = serializer_class.values_queryset(model.objects.order_by('pk'))
+            return renderer.render(serializer_class.fast_representation(list(queryset)))
+
+        before = measure('ModelSerializer', rows, serializer_path, args.repeat)
+        after = measure('values() + fast_representation', rows, fast_path, args.repeat)
+        print(f"   JSON совпадает: {'да' if before == after else 'НЕТ'}")
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI-сервер с фиксированным пулом из workers потоков"""
+    request_queue_size = 1024
+
+    def __init__(self, address, workers):
+        super().__init__(address, QuietHandler)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def server_bind(self):
+        # Принятые соединения наследуют буфер отправки слушающего сокета
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SERVER_SNDBUF)
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def start_wsgi_server(workers):
+    from django.core.wsgi import get_wsgi_application
+
+    server = PooledWSGIServer(('127.0.0.1', 0), workers)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1], server.shutdown
+
+
+def start_asgi_server():
+    import uvicorn
+    from django.core.asgi import get_asgi_application
+
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SERVER_SNDBUF)
+    sock.bind(('127.0.0.1', 0))
+    config = uvicorn.Config(get_asgi_application(), log_level='warning', lifespan='off', backlog=2048)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+    return sock.getsockname()[1], stop
+
+
+async def slow_request(port, url, headers, delay):
+    """Медленный клиент: читает ответ порциями по READ_CHUNK байт раз в delay секунд.
+
+    Буферы сокета клиента маленькие, поэтому ответ больше буферов WSGI-сервер
+    отдает, держа поток из пула, пока клиент не дочитает; под ASGI ожидание
+    отправки занимает только корутину. Возвращает статус ответа и время
+    от подключения до конца ответа.
+    """
+    start = time.perf_counter()
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, READ_CHUNK)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, ('127.0.0.1', port))
+    reader, writer = await asyncio.open_connection(sock=sock, limit=READ_CHUNK)
+    lines = [f'GET {url} HTTP/1.1', 'Host: 127.0.0.1', 'Connection: close']
+    lines += [f'{name}: {value}' for name, value in headers.items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+    await writer.drain()
+    response = b''
+    while chunk := await reader.read(READ_CHUNK):
+        response += chunk
+        await asyncio.sleep(delay)
+    writer.close()
+    return int(response.split(b' ', 2)[1]), time.perf_counter() - start
+
+
+async def run_clients(port, url, headers, args):
+    """args.concurrency медленных клиентов одновременно; время ответа каждого"""
+    results = await asyncio.gather(*(
+        slow_request(port, url, headers, args.delay) for _ in range(args.concurrency)
+    ))
+    assert {status for status, latency in results} == {200}, results
+    return sorted(latency for status, latency in results)
+
+
+def bench_asgi(args):
+    """Синхронный DRF под WSGI-сервером против асинхронных представлений под ASGI.
+
+    Оба сервера запускаются в этом процессе на настоящих сокетах: WSGI - с
+    пулом из workers потоков, ASGI - uvicorn с одним циклом событий.
+    Медленные клиенты читают ответ по READ_CHUNK байт раз в delay секунд:
+    под WSGI каждый занимает поток пула, пока не дочитает ответ, и
+    остальные ждут в очереди; под ASGI отправка ждет в цикле событий.
+    """
+    from rest_framework.authtoken.models import Token
+
+    manager, _ = create_data(max(1, args.tasks // 20), 20, args.comments)
+    headers = {'Authorization': f'Token {Token.objects.create(user=manager).key}'}
+    print(f"\n{args.concurrency} клиентов, чтение по {READ_CHUNK // 1024} КБ раз в {args.delay * 1000:.0f} мс, "
+          f"потоков WSGI: {args.workers}")
+
+    servers = [(f'WSGI (DRF, потоков: {args.workers})', start_wsgi_server(args.workers), 0)]
+    if importlib.util.find_spec('uvicorn') is not None:
+        servers.append(('ASGI (async views, uvicorn)', start_asgi_server(), 1))
+    else:
+        print("пакет uvicorn не установлен - только WSGI")
+
+    urls = (
+        ('/api/tasks/?page_size=100', '/api/async/tasks/?page_size=100'),
+        ('/api/projects/', '/api/async/projects/'),
+    )
+    for pair in urls:
+        print(f"\n{pair[0]}")
+        for label, (port, stop), url_index in servers:
+            start = time.perf_counter()
+            latencies = asyncio.run(run_clients(port, pair[url_index], headers, args))
+            elapsed = time.perf_counter() - start
+            p50, p95 = (latencies[int(len(latencies) * q) - 1] for q in (0.5, 0.95))
+            print(f"   {label:<32} {elapsed * 1000:9.1f} мс   {len(latencies) / elapsed:8,.0f} запросов/с   "
+                  f"p50 {p50 * 1000:7.1f} мс   p95 {p95 * 1000:7.1f} мс")
+    for label, (port, stop), url_index in servers:
+        stop()
+
+
+def bench_renderers(args):
+    """JSON против MessagePack: время кодирования и размер ответа с gzip и без"""
+    from rest_framework.renderers import JSONRenderer
+    from api.renderers import MessagePackRenderer, msgpack
+    from api.serializers import TaskSerializer
+    from projects.models import Task
+
+    create_data(max(1, args.tasks // 20), 20, args.comments)
+    renderers = [('JSON', JSONRenderer())]
+    if msgpack is not None:
+        renderers.append(('MessagePack', MessagePackRenderer()))
+    else:
+        print("пакет msgpack не установлен - только JSON")
+
+    queryset = TaskSerializer.values_queryset(Task.objects.order_by('pk'))
+    data = TaskSerializer.fast_representation(list(queryset))
+    rows = len(data)
+    print(f"\nTaskSerializer: {rows} строк")
+    for label, renderer in renderers:
+        body = measure(label, rows, lambda: renderer.render(data), args.repeat)
+        compressed = measure(f'{label} + gzip', rows, lambda: gzip.compress(renderer.render(data), 6), args.repeat)
+        print(f"   {'':<32} {len(body) / 1024:9.1f} КБ   gzip {len(compressed) / 1024:9.1f} КБ")
+
+
+BENCHMARKS = {
+    'asgi': bench_asgi,
+    'renderers': bench_renderers,
+    'serializers': bench_serializers,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарки API ProjectFlow')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--tasks', type=int, default=2000, help='число задач')
+    parser.add_argument('--comments', type=int, default=3, help='комментариев на задачу')
+    parser.add_argument('--repeat', type=int, default=3, help='число повторов')
+    parser.add_argument('--concurrency', type=int, default=200, help='одновременных медленных клиентов (asgi)')
+    parser.add_argument('--delay', type=float, default=0.01, help='пауза медленного клиента между порциями чтения, с (asgi)')
+    parser.add_argument('--workers', type=int, default=8, help='потоков WSGI-сервера (asgi)')
+    args = parser.parse_args()
+
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        BENCHMARKS[args.benchmark](args)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
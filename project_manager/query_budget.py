@@ -0,0 +1,148 @@
+"""
+Учет SQL-запросов на запрос: число, суммарное время и повторы.
+
+QueryRecorder подключается к соединению через execute_wrapper и работает
+без DEBUG. Повторы определяются по отпечатку запроса - тексту SQL с
+плейсхолдерами, так что N+1 (один и тот же SELECT для каждой строки) дает
+один отпечаток с большим числом повторов.
+
+QueryBudgetMiddleware пишет итоги в лог и предупреждает о N+1 и о
+превышении бюджета из QUERY_BUDGETS (по имени URL). QueryBudgetTestMixin
+позволяет проверять те же бюджеты в тестах.
+"""
+import logging
+import re
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)')
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Текст запроса без различий в длине списков IN (...) и пробелах"""
+    return _SPACES.sub(' ', _IN_LIST.sub('IN (...)', sql)).strip()
+
+
+class QueryRecorder:
+    """Контекстный менеджер, записывающий запросы к базе using"""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        # Соединения привязаны к потоку: берем соединение того потока, где
+        # выполняются запросы
+        self.connection = connections[self.using]
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for sql, duration in self.queries)
+
+    def repeated(self, threshold=None):
+        """Отпечатки, выполненные не меньше threshold раз: кандидаты в N+1"""
+        if threshold is None:
+            threshold = settings.QUERY_BUDGET_REPEAT_THRESHOLD
+        counts = Counter(fingerprint(sql) for sql, duration in self.queries)
+        return {sql: count for sql, count in counts.most_common() if count >= threshold}
+
+
+class QueryBudgetMiddleware:
+    """Считает запросы к базе на каждый запрос и пишет итоги в лог.
+
+    Добавляет заголовки X-Query-Count и X-Query-Time (мс). Запросы
+    потоковых ответов, выполненные при отдаче тела, не учитываются.
+    Работает и в синхронной, и в асинхронной цепочке middleware. Под ASGI
+    запросы ORM выполняются в потоке sync_to_async, общем для всего запроса,
+    поэтому учет включается на соединении этого потока.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        await sync_to_async(recorder.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        match = request.resolver_match
+        url_name = match.view_name if match else request.path_info
+        elapsed = recorder.total_time * 1000
+        response['X-Query-Count'] = str(recorder.count)
+        response['X-Query-Time'] = f'{elapsed:.1f}'
+        logger.debug('%s: %d queries, %.1f ms', url_name, recorder.count, elapsed)
+
+        for sql, count in recorder.repeated().items():
+            logger.warning('Possible N+1 in %s: %d x %s', url_name, count, sql)
+        budget = settings.QUERY_BUDGETS.get(url_name)
+        if budget is not None and recorder.count > budget:
+            logger.warning('Query budget exceeded in %s: %d > %d', url_name, recorder.count, budget)
+        return response
+
+
+class QueryBudgetTestMixin:
+    """Проверка бюджета запросов страницы в тестах"""
+
+    def assertQueryBudget(self, url_name, budget=None, args=None, kwargs=None, data=None, client=None):
+        """GET по имени URL: не больше budget запросов (по умолчанию из
+        QUERY_BUDGETS) и без повторяющихся запросов. Возвращает ответ."""
+        if budget is None:
+            budget = settings.QUERY_BUDGETS[url_name]
+        client = client or self.client
+        with QueryRecorder() as recorder:
+            response = client.get(reverse(url_name, args=args, kwargs=kwargs), data)
+        queries = '\n'.join(sql for sql, duration in recorder.queries)
+        self.assertLessEqual(
+            recorder.count, budget,
+            f'{url_name}: {recorder.count} queries, budget {budget}\n{queries}'
+        )
+        repeated = recorder.repeated()
+        self.assertFalse(
+            repeated,
+            f'{url_name}: possible N+1\n' + '\n'.join(f'{count} x {sql}' for sql, count in repeated.items())
+        )
+        return response
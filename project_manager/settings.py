@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/4.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
+import importlib.util
 import os
 from pathlib import Path
 import sys  # Добавляем этот импорт!
@@ -50,7 +51,10 @@ INSTALLED_APPS = [
 ]
 
 # Настройки аутентификации
+# ModelBackend оставлен для сессий, созданных до ProfileModelBackend: сессия
+# хранит путь к бэкенду, и без него такие пользователи разлогинились бы
 AUTHENTICATION_BACKENDS = [
+    'accounts.backends.ProfileModelBackend',
     'django.contrib.auth.backends.ModelBackend',
 ]
 
@@ -60,11 +64,14 @@ LOGIN_URL = 'login'
 
 
 MIDDLEWARE = [
+    'project_manager.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.APIGZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,6 +89,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'accounts.context_processors.role',
             ],
         },
     },
@@ -100,6 +108,27 @@ DATABASES = {
     }
 }
 
+# Кэш
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Фрагменты шаблонов по умолчанию хранятся в памяти процесса; с переменной
+# окружения FRAGMENT_CACHE_DIR - в файлах, общих для всех процессов
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+if os.environ.get('FRAGMENT_CACHE_DIR'):
+    CACHES['fragments'].update({
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['FRAGMENT_CACHE_DIR'],
+    })
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -150,18 +179,113 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10
 }
 
+# MessagePack (api.renderers) - если установлен пакет msgpack
+if importlib.util.find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('api.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('api.renderers.MessagePackParser')
+
+# Сжатие ответов API (api.middleware.APIGZipMiddleware): префикс пути и
+# минимальный размер ответа в байтах; потоковые ответы сжимаются всегда
+API_GZIP_PATH_PREFIX = '/api/'
+API_GZIP_MIN_SIZE = 1024
+
+# Число проектов и задач на странице списков проектов и задач
+PROJECT_LIST_PAGE_SIZE = 20
+TASK_LIST_PAGE_SIZE = 50
+
+# Максимальное число задач в колонке канбан-доски проекта
+BOARD_COLUMN_LIMIT = 100
+
+# Кэш фрагментов шаблонов (projects.fragments): алиас из CACHES и время
+# жизни фрагмента в секундах
+FRAGMENT_CACHE_ALIAS = 'fragments'
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Время жизни кэша сводной статистики задач (projects.stats), секунд
+TASK_STATS_CACHE_TIMEOUT = 300
+
+# Дашборд главной страницы (projects.dashboard): размер каждого списка
+# и время жизни кэша на пользователя, секунд
+DASHBOARD_LIMIT = 10
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# Кэш токенов API: алиас из CACHES и время жизни записи в секундах
+API_TOKEN_CACHE_ALIAS = 'default'
+API_TOKEN_CACHE_TIMEOUT = 300
+
+# Максимальный page_size для keyset-пагинации (api.pagination)
+API_CURSOR_MAX_PAGE_SIZE = 100
+
+# Максимальное число операций в POST /api/tasks/bulk/
+API_BULK_MAX_OPERATIONS = 500
+
+# Размер порции чтения для GET /api/tasks/export/
+API_EXPORT_CHUNK_SIZE = 2000
+
+# Максимальное число строк каждого типа в одном ответе GET /api/changes/
+API_CHANGES_MAX_ROWS = 500
+
+# Окно пересмотра GET /api/changes/ в секундах: updated_at ставится до коммита,
+# транзакция дольше окна может потерять изменение для клиентов синхронизации
+API_CHANGES_LAG_SECONDS = 30
+
+# Срок хранения записей об удалениях в днях (prune_tombstones); watermark
+# старше этого срока GET /api/changes/ отклоняет с 410
+API_CHANGES_RETENTION_DAYS = 30
+
+# Учет SQL-запросов (project_manager.query_budget): включение middleware,
+# число одинаковых запросов, начиная с которого это считается N+1, и
+# бюджеты запросов по имени URL
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_REPEAT_THRESHOLD = 3
+QUERY_BUDGETS = {
+    'home': 7,
+    'login': 2,
+    'register': 2,
+    'profile': 3,
+    'user_management': 5,
+    'project_list': 6,
+    'project_create': 4,
+    'task_list': 7,
+    'task_detail': 4,
+    'project_board': 4,
+    'project_update': 4,
+    'task_create': 5,
+    'task_update': 5,
+    'project-list': 6,
+    'project-detail': 5,
+    'task-list': 5,
+    'task-detail': 5,
+    'comment-list': 4,
+    'api_stats': 3,
+    'api_dashboard': 8,
+    'api_search': 3,
+    'api_changes': 6,
+}
+
 # Добавляем в конец settings.py
 if 'test' in sys.argv:
     DATABASES['default'] = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',
     }
+    # В тестах бюджеты проверяет QueryBudgetTestMixin, а не лог
+    QUERY_BUDGET_ENABLED = False
@@ -1,23 +1,47 @@
 from django.contrib import admin
+from django.db.models import Q
 from .models import Project, Task, Comment
+from .search import match_query, matching_ids, search_available
+
+class FullTextSearchMixin:
+    """Поиск в админке по индексу FTS5 вместо LIKE '%...%' по search_fields.
+    
+    search_fields остаются для отображения строки поиска; поля из
+    search_extra_fields (не попавшие в индекс) ищутся как обычно.
+    """
+    search_kind = None
+    search_extra_fields = []
+    
+    def get_search_results(self, request, queryset, search_term):
+        query = match_query(search_term)
+        if query is None or not search_available():
+            return super().get_search_results(request, queryset, search_term)
+        condition = Q(pk__in=matching_ids(self.search_kind, query))
+        for field in self.search_extra_fields:
+            condition |= Q(**{f'{field}__icontains': search_term})
+        return queryset.filter(condition), False
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ['title', 'status', 'created_by', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['title', 'description']
+    search_kind = 'project'
     readonly_fields = ['created_at', 'updated_at']
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ['title', 'project', 'priority', 'status', 'assigned_to', 'due_date']
     list_filter = ['priority', 'status', 'created_at']
     search_fields = ['title', 'description']
+    search_kind = 'task'
     readonly_fields = ['created_at', 'updated_at']
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ['author', 'task', 'created_at']
     list_filter = ['created_at']
     search_fields = ['content', 'author__username']
+    search_kind = 'comment'
+    search_extra_fields = ['author__username']
     readonly_fields = ['created_at', 'updated_at']
\ No newline at end of file
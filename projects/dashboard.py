@@ -0,0 +1,60 @@
+"""
+Данные главной страницы ("мой дашборд") для home.html и /api/dashboard/.
+
+Не больше пяти запросов независимо от объема данных: мои открытые задачи,
+просроченные, последние комментарии к моим задачам, активные проекты и
+сводка по статусам (projects.stats, обычно из кэша). Каждый список
+ограничен DASHBOARD_LIMIT. Результат кэшируется на пользователя до
+изменения данных (версия из projects.stats).
+"""
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+
+from .models import Comment, Project, Task
+from .stats import cached_task_stats, data_version, stats_scope
+
+TASK_FIELDS = ('id', 'title', 'status', 'priority', 'due_date', 'project')
+
+
+def _task_rows(queryset, limit):
+    return list(
+        queryset.with_overdue().order_by(F('due_date').asc(nulls_last=True), 'id')
+        .values(*TASK_FIELDS, 'is_overdue', project_title=F('project__title'))[:limit]
+    )
+
+
+def build_dashboard(user):
+    limit = settings.DASHBOARD_LIMIT
+    visible = Task.objects.visible_to(user)
+    stats = cached_task_stats(visible, stats_scope(user))
+    return {
+        'my_tasks': _task_rows(Task.objects.filter(assigned_to=user).exclude(status='done'), limit),
+        'overdue_tasks': _task_rows(visible.overdue(), limit),
+        'status_counts': stats['by_status'],
+        'total_tasks': stats['total'],
+        'overdue_count': stats['overdue'],
+        'recent_comments': list(
+            Comment.objects.filter(task__assigned_to=user).order_by('-created_at', '-id').values(
+                'id', 'task', 'content', 'created_at',
+                task_title=F('task__title'), author_name=F('author__username'),
+            )[:limit]
+        ),
+        'active_projects': list(
+            Project.objects.filter(status='active').order_by('-updated_at', '-id').annotate(
+                open_tasks=Count('tasks', filter=~Q(tasks__status='done'))
+            ).values('id', 'title', 'updated_at', 'open_tasks')[:limit]
+        ),
+    }
+
+
+def cached_dashboard(user):
+    """build_dashboard с кэшем на пользователя, версию данных и дату"""
+    key = f'projects.dashboard:{user.pk}:{data_version()}:{date.today().isoformat()}'
+    dashboard = cache.get(key)
+    if dashboard is None:
+        dashboard = build_dashboard(user)
+        cache.set(key, dashboard, settings.DASHBOARD_CACHE_TIMEOUT)
+    return dashboard
@@ -0,0 +1,102 @@
+"""
+Кэш HTML-фрагментов: карточки проектов и строки задач в списках.
+
+Ключ фрагмента - имя, id объекта, updated_at, версия объекта, роль
+зрителя и необязательные дополнительные значения. Версии хранятся в том
+же кэше (FRAGMENT_CACHE_ALIAS) и обновляются сигналами из projects.models:
+у задачи - при изменении ее комментариев, у проекта - при изменении его
+задач (счетчики на карточке).
+Версии страницы читаются одним get_many (attach_fragment_versions).
+
+Счетчики попаданий и промахов ведутся по имени фрагмента в памяти
+процесса и доступны через fragment_stats().
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+VERSION_PREFIX = 'fragments.version'
+
+_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+def _cache():
+    return caches[settings.FRAGMENT_CACHE_ALIAS]
+
+
+def version_key(kind, pk):
+    return f'{VERSION_PREFIX}:{kind}:{pk}'
+
+
+def bump_fragment_versions(kind, pks):
+    """Делает устаревшими фрагменты объектов kind ('project', 'task') с id из pks"""
+    # Новая версия - текущее время: после вытеснения ключа из кэша
+    # версия не повторит уже использованную
+    version = time.time_ns()
+    _cache().set_many({version_key(kind, pk): version for pk in pks if pk is not None}, None)
+
+
+def attach_fragment_versions(objects):
+    """Проставляет объектам fragment_version одним обращением к кэшу"""
+    objects = list(objects)
+    if not objects:
+        return
+    kind = objects[0]._meta.model_name
+    keys = {obj.pk: version_key(kind, obj.pk) for obj in objects}
+    cache = _cache()
+    versions = cache.get_many(keys.values())
+    missing = {key: time.time_ns() for key in keys.values() if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    for obj in objects:
+        obj.fragment_version = versions[keys[obj.pk]]
+
+
+def fragment_key(name, obj, role, vary_on=()):
+    if getattr(obj, 'fragment_version', None) is None:
+        attach_fragment_versions([obj])
+    updated_at = obj.updated_at.timestamp() if obj.updated_at else ''
+    key = f'fragments:{name}:{obj.pk}:{updated_at}:{obj.fragment_version}:{role}'
+    if vary_on:
+        key += ':' + hashlib.md5(':'.join(str(value) for value in vary_on).encode()).hexdigest()
+    return key
+
+
+def cached_fragment(name, obj, role, render, vary_on=()):
+    """HTML фрагмента name для obj из кэша или результат render()"""
+    cache = _cache()
+    key = fragment_key(name, obj, role, vary_on)
+    html = cache.get(key)
+    with _lock:
+        (_misses if html is None else _hits)[name] += 1
+    if html is None:
+        html = render()
+        cache.set(key, html, settings.FRAGMENT_CACHE_TIMEOUT)
+    return html
+
+
+def fragment_stats():
+    """Попадания, промахи и доля попаданий по именам фрагментов"""
+    with _lock:
+        names = sorted(set(_hits) | set(_misses))
+        return {
+            name: {
+                'hits': _hits[name],
+                'misses': _misses[name],
+                'hit_ratio': round(_hits[name] / (_hits[name] + _misses[name]), 4),
+            }
+            for name in names
+        }
+
+
+def reset_fragment_stats():
+    with _lock:
+        _hits.clear()
+        _misses.clear()
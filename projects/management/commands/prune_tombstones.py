@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from projects.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = 'Удаляет записи об удалениях старше API_CHANGES_RETENTION_DAYS дней'
+
+    def handle(self, *args, **options):
+        deleted, _ = Tombstone.objects.filter(deleted_at__lt=timezone.now() - Tombstone.retention()).delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей: {deleted}'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from projects.search import SEARCH_KINDS, SEARCH_TABLE, search_available
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс проектов, задач и комментариев порциями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='строк в одной транзакции')
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError('Полнотекстовый поиск поддерживается только для SQLite')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть положительным')
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            for kind, (code, table, title, body) in SEARCH_KINDS.items():
+                total, last_id = 0, 0
+                while True:
+                    # Порция по диапазону id: каждая в своей транзакции, без OFFSET
+                    with transaction.atomic():
+                        cursor.execute(
+                            f'SELECT MAX(id), COUNT(*) FROM (SELECT id FROM {table} '
+                            f'WHERE id > %s ORDER BY id LIMIT %s)',
+                            [last_id, batch_size]
+                        )
+                        batch_last_id, count = cursor.fetchone()
+                        if not count:
+                            break
+                        cursor.execute(
+                            f'INSERT INTO {SEARCH_TABLE}(rowid, title, body) '
+                            f'SELECT id * 4 + %s, {title}, {body} FROM {table} WHERE id > %s AND id <= %s',
+                            [code, last_id, batch_last_id]
+                        )
+                    total += count
+                    last_id = batch_last_id
+                self.stdout.write(f'{kind}: {total}')
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+        self.stdout.write(self.style.SUCCESS('Индекс поиска перестроен'))
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_task_comment_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('project', 'Проект'), ('task', 'Задача'), ('comment', 'Комментарий')], max_length=10, verbose_name='Модель')),
+                ('object_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('assigned_to_id', models.BigIntegerField(blank=True, null=True, verbose_name='Исполнитель')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата удаления')),
+            ],
+            options={
+                'verbose_name': 'Удаленный объект',
+                'verbose_name_plural': 'Удаленные объекты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['updated_at', 'id'], name='comment_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['updated_at', 'id'], name='project_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['updated_at', 'id'], name='task_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_id_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Полнотекстовый индекс FTS5 и триггеры синхронизации (projects.search)
+
+from django.db import migrations
+
+# Таблица: (код типа в rowid, колонка заголовка, колонка текста)
+SOURCES = {
+    'projects_project': (1, 'title', 'description'),
+    'projects_task': (2, 'title', 'description'),
+    'projects_comment': (3, "''", 'content'),
+}
+
+
+def _values(code, title, body, row):
+    title = title if title == "''" else f'{row}.{title}'
+    return f'{row}.id * 4 + {code}, {title}, {row}.{body}'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    statements = [
+        "CREATE VIRTUAL TABLE projects_search USING fts5("
+        "title, body, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    ]
+    for table, (code, title, body) in SOURCES.items():
+        changed = f'old.{body} IS NOT new.{body}'
+        if title != "''":
+            changed = f'old.{title} IS NOT new.{title} OR {changed}'
+        statements += [
+            f"INSERT INTO projects_search(rowid, title, body) "
+            f"SELECT {_values(code, title, body, table)} FROM {table}",
+            f"CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO projects_search(rowid, title, body) VALUES ({_values(code, title, body, 'new')}); END",
+            f"CREATE TRIGGER {table}_search_update AFTER UPDATE ON {table} "
+            f"WHEN old.id IS NOT new.id OR {changed} BEGIN "
+            f"DELETE FROM projects_search WHERE rowid = old.id * 4 + {code}; "
+            f"INSERT INTO projects_search(rowid, title, body) VALUES ({_values(code, title, body, 'new')}); END",
+            f"CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM projects_search WHERE rowid = old.id * 4 + {code}; END",
+        ]
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in SOURCES:
+        for event in ('insert', 'update', 'delete'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_{event}')
+    schema_editor.execute('DROP TABLE IF EXISTS projects_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_task_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
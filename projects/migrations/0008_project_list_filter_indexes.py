@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0007_comment_task_created_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['status', 'updated_at', 'id'], name='project_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['created_by', 'updated_at', 'id'], name='project_owner_updated_idx'),
+        ),
+    ]
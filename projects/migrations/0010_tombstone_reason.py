@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_task_overdue_partial_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tombstone',
+            name='reason',
+            field=models.CharField(choices=[('deleted', 'Удален'), ('unassigned', 'Снято назначение')], default='deleted', max_length=10, verbose_name='Причина'),
+        ),
+    ]
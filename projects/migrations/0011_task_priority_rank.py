@@ -0,0 +1,49 @@
+# Ранг приоритета задачи для индексной сортировки ?ordering=priority
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_index = import_module('projects.migrations.0006_search_index')
+
+# Совпадает с Task.PRIORITY_RANKS
+PRIORITY_RANKS = {'low': 0, 'medium': 1, 'high': 2}
+
+
+def fill_priority_rank(apps, schema_editor):
+    Task = apps.get_model('projects', 'Task')
+    for priority, rank in PRIORITY_RANKS.items():
+        Task.objects.filter(priority=priority).update(priority_rank=rank)
+
+
+def rebuild_search_index(apps, schema_editor):
+    # SQLite пересобирает таблицу задач при добавлении и удалении колонки,
+    # и триггеры полнотекстового индекса (0006) пропадают вместе с ней
+    search_index.drop_search_index(apps, schema_editor)
+    search_index.create_search_index(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0010_tombstone_reason'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, rebuild_search_index),
+        migrations.AddField(
+            model_name='task',
+            name='priority_rank',
+            field=models.PositiveSmallIntegerField(default=1, editable=False, verbose_name='Ранг приоритета'),
+        ),
+        migrations.RunPython(fill_priority_rank, migrations.RunPython.noop),
+        migrations.RunPython(rebuild_search_index, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['priority', 'created_at', 'id'], name='task_priority_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['priority_rank', 'id'], name='task_priority_rank_idx'),
+        ),
+    ]
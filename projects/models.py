@@ -1,7 +1,14 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import BooleanField, Case, Q, Value, When
 from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
-from datetime import date
+from datetime import date, timedelta
+from accounts.roles import role_of
+from .fragments import bump_fragment_versions
+from .stats import bump_data_version
 
 class Project(models.Model):
     STATUS_CHOICES = [
@@ -26,6 +33,42 @@ class Project(models.Model):
         permissions = [
             ("can_delete_project", "Can delete project"),
         ]
+        indexes = [
+            # Лента изменений API по (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='project_updated_id_idx'),
+            # Фильтры списка проектов по статусу и создателю
+            models.Index(fields=['status', 'updated_at', 'id'], name='project_status_updated_idx'),
+            models.Index(fields=['created_by', 'updated_at', 'id'], name='project_owner_updated_idx'),
+        ]
+
+class TaskQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """Задачи, доступные пользователю по роли: менеджеры и администраторы
+        видят все, пользователи - только назначенные им"""
+        role = role_of(user)
+        if role.can_manage:
+            return self.all()
+        if role.is_user:
+            return self.filter(assigned_to=user)
+        return self.none()
+    
+    def completable_by(self, user):
+        """Задачи, которые пользователь может завершить: пользователи -
+        только назначенные им, менеджеры и администраторы - любые"""
+        role = role_of(user)
+        if role.is_user:
+            return self.filter(assigned_to=user)
+        if role.can_manage:
+            return self.all()
+        return self.none()
+    
+    def with_overdue(self):
+        """Аннотация is_overdue, вычисленная в SQL"""
+        return self.annotate(is_overdue=self.model.overdue_annotation())
+    
+    def overdue(self):
+        """Просроченные задачи; условие совпадает с частичным индексом task_overdue_idx"""
+        return self.filter(self.model.overdue_q())
 
 class Task(models.Model):
     PRIORITY_CHOICES = [
@@ -41,26 +84,70 @@ class Task(models.Model):
         ('done', 'Выполнено'),
     ]
     
+    # Ранг приоритета для сортировки: low < medium < high
+    PRIORITY_RANKS = {'low': 0, 'medium': 1, 'high': 2}
+    
     title = models.CharField(_('Название'), max_length=200)
     description = models.TextField(_('Описание'))
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='tasks', verbose_name=_('Проект'))
     assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_tasks', verbose_name=_('Исполнитель'))
     priority = models.CharField(_('Приоритет'), max_length=10, choices=PRIORITY_CHOICES, default='medium')
+    # Хранится, а не вычисляется в SQL, чтобы ?ordering=priority шел по индексу
+    priority_rank = models.PositiveSmallIntegerField(_('Ранг приоритета'), default=1, editable=False)
     status = models.CharField(_('Статус'), max_length=15, choices=STATUS_CHOICES, default='todo')
     due_date = models.DateField(_('Срок выполнения'), null=True, blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_tasks', verbose_name=_('Создатель'))
     created_at = models.DateTimeField(_('Дата создания'), auto_now_add=True)
     updated_at = models.DateTimeField(_('Дата обновления'), auto_now=True)
     
+    objects = TaskQuerySet.as_manager()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Проект при загрузке: при переносе задачи сбрасывается и карточка старого проекта
+        instance._loaded_project_id = instance.__dict__.get('project_id')
+        # Исполнитель при загрузке: при переназначении прежний получает запись о снятии
+        instance._loaded_assigned_to_id = instance.__dict__.get('assigned_to_id')
+        return instance
+    
     def __str__(self):
         return f"{self.title} - {self.project.title}"
     
+    def save(self, *args, **kwargs):
+        self.sync_priority_rank()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'priority' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'priority_rank'}
+        super().save(*args, **kwargs)
+    
+    def sync_priority_rank(self):
+        """Ранг по приоритету; bulk_create и bulk_update вызывают его явно"""
+        self.priority_rank = self.PRIORITY_RANKS.get(self.priority, self.PRIORITY_RANKS['medium'])
+    
+    @staticmethod
+    def overdue_q(prefix=''):
+        """Условие просрочки для filter()/Count(filter=); prefix - путь к задаче от другой модели"""
+        return Q(**{f'{prefix}due_date__lt': date.today()}) & ~Q(**{f'{prefix}status': 'done'})
+    
+    @staticmethod
+    def overdue_annotation():
+        """is_overdue в SQL: False и для задач без срока, а не NULL"""
+        return Case(When(Task.overdue_q(), then=Value(True)), default=Value(False), output_field=BooleanField())
+    
+    @property
     def is_overdue(self):
-        """Проверяет, просрочена ли задача"""
+        """Просрочена ли задача: из аннотации with_overdue(), если она есть"""
+        if '_is_overdue' in self.__dict__:
+            return self._is_overdue
         if self.due_date and self.status != 'done':
             return self.due_date < date.today()
         return False
     
+    @is_overdue.setter
+    def is_overdue(self, value):
+        self._is_overdue = value
+    
     def can_user_complete(self, user):
         """Проверяет, может ли пользователь завершить задачу"""
         return (
@@ -72,6 +159,23 @@ class Task(models.Model):
     class Meta:
         verbose_name = _('Задача')
         verbose_name_plural = _('Задачи')
+        indexes = [
+            # Keyset-пагинация API по (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='task_created_id_idx'),
+            # Лента изменений API по (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='task_updated_id_idx'),
+            # Фильтры API (api.filters.TaskFilter)
+            models.Index(fields=['assigned_to', 'status'], name='task_assigned_status_idx'),
+            models.Index(fields=['project', 'status'], name='task_project_status_idx'),
+            models.Index(fields=['status', 'due_date'], name='task_status_due_idx'),
+            models.Index(fields=['priority', 'created_at', 'id'], name='task_priority_created_idx'),
+            # ?ordering=priority
+            models.Index(fields=['priority_rank', 'id'], name='task_priority_rank_idx'),
+            # Фильтр по сроку и ?ordering=due_date
+            models.Index(fields=['due_date', 'id'], name='task_due_id_idx'),
+            # Просроченные задачи (Task.overdue_q): только невыполненные
+            models.Index(fields=['due_date'], name='task_overdue_idx', condition=~Q(status='done')),
+        ]
 
 class Comment(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='comments', verbose_name=_('Задача'))
@@ -85,4 +189,99 @@ class Comment(models.Model):
     
     class Meta:
         verbose_name = _('Комментарий')
-        verbose_name_plural = _('Комментарии')
\ No newline at end of file
+        verbose_name_plural = _('Комментарии')
+        indexes = [
+            # Keyset-пагинация API по (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='comment_created_id_idx'),
+            # Лента изменений API по (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='comment_updated_id_idx'),
+            # Комментарии задачи /api/tasks/{id}/comments/ по (created_at, id)
+            models.Index(fields=['task', 'created_at', 'id'], name='comment_task_created_idx'),
+        ]
+
+class Tombstone(models.Model):
+    """Запись об удаленном объекте для клиентов синхронизации (ленты изменений)"""
+    MODEL_CHOICES = [
+        ('project', 'Проект'),
+        ('task', 'Задача'),
+        ('comment', 'Комментарий'),
+    ]
+    
+    REASON_CHOICES = [
+        ('deleted', 'Удален'),
+        ('unassigned', 'Снято назначение'),
+    ]
+    
+    model = models.CharField(_('Модель'), max_length=10, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField(_('ID объекта'))
+    # Исполнитель удаленной задачи: пользователи видят только свои задачи
+    assigned_to_id = models.BigIntegerField(_('Исполнитель'), null=True, blank=True)
+    # unassigned - задача переназначена: для прежнего исполнителя она исчезла
+    reason = models.CharField(_('Причина'), max_length=10, choices=REASON_CHOICES, default='deleted')
+    deleted_at = models.DateTimeField(_('Дата удаления'), auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.get_model_display()} #{self.object_id}"
+    
+    @staticmethod
+    def retention():
+        """Срок хранения записей: более старые удаляет команда prune_tombstones"""
+        return timedelta(days=settings.API_CHANGES_RETENTION_DAYS)
+    
+    class Meta:
+        verbose_name = _('Удаленный объект')
+        verbose_name_plural = _('Удаленные объекты')
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_id_idx'),
+        ]
+
+# Сигналы для записи удалений, включая каскадные и удаления через QuerySet.delete()
+@receiver(post_delete, sender=Project)
+def record_project_delete(sender, instance, **kwargs):
+    Tombstone.objects.create(model='project', object_id=instance.pk)
+
+@receiver(post_delete, sender=Task)
+def record_task_delete(sender, instance, **kwargs):
+    Tombstone.objects.create(model='task', object_id=instance.pk, assigned_to_id=instance.assigned_to_id)
+
+@receiver(post_delete, sender=Comment)
+def record_comment_delete(sender, instance, **kwargs):
+    Tombstone.objects.create(model='comment', object_id=instance.pk)
+
+def record_unassignments(tasks):
+    """Записи о снятии назначения для задач, переназначенных с момента загрузки.
+    
+    Вызывается из post_save и явно после bulk_update, который сигналов не отправляет.
+    """
+    tombstones = []
+    for task in tasks:
+        loaded = getattr(task, '_loaded_assigned_to_id', None)
+        if loaded is not None and loaded != task.assigned_to_id:
+            tombstones.append(Tombstone(model='task', object_id=task.pk, assigned_to_id=loaded, reason='unassigned'))
+        task._loaded_assigned_to_id = task.assigned_to_id
+    Tombstone.objects.bulk_create(tombstones)
+
+@receiver(post_save, sender=Task)
+def record_task_unassign(sender, instance, **kwargs):
+    record_unassignments([instance])
+
+# Версия данных для кэша сводной статистики и дашборда (projects.stats)
+@receiver([post_save, post_delete], sender=Project)
+@receiver([post_save, post_delete], sender=Task)
+@receiver([post_save, post_delete], sender=Comment)
+def bump_stats_version(sender, **kwargs):
+    bump_data_version()
+
+# Версии фрагментов шаблонов (projects.fragments)
+@receiver([post_save, post_delete], sender=Project)
+def bump_project_fragments(sender, instance, **kwargs):
+    bump_fragment_versions('project', [instance.pk])
+
+@receiver([post_save, post_delete], sender=Task)
+def bump_task_fragments(sender, instance, **kwargs):
+    bump_fragment_versions('task', [instance.pk])
+    bump_fragment_versions('project', {instance.project_id, getattr(instance, '_loaded_project_id', None)})
+
+@receiver([post_save, post_delete], sender=Comment)
+def bump_comment_fragments(sender, instance, **kwargs):
+    bump_fragment_versions('task', [instance.task_id])
@@ -0,0 +1,102 @@
+"""
+Полнотекстовый поиск по проектам, задачам и комментариям (SQLite FTS5).
+
+Индекс - одна FTS5-таблица projects_search(title, body); rowid кодирует
+тип и id объекта: id * 4 + код типа. Таблицу и триггеры, которые держат ее
+в актуальном состоянии при любых INSERT/UPDATE/DELETE (в том числе
+bulk_create и update()), создает миграция 0006; полная перестройка -
+команда rebuild_search_index.
+"""
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+SEARCH_TABLE = 'projects_search'
+
+# Тип объекта: (код в rowid, таблица, колонка заголовка, колонка текста)
+SEARCH_KINDS = {
+    'project': (1, 'projects_project', 'title', 'description'),
+    'task': (2, 'projects_task', 'title', 'description'),
+    'comment': (3, 'projects_comment', "''", 'content'),
+}
+
+# Маркеры совпадений в snippet(); заменяются на <mark> после экранирования
+_MARK_START, _MARK_END = '\x02', '\x03'
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_query(text):
+    """Запрос FTS5 из пользовательского текста: все слова, последнее - по префиксу.
+    
+    Слова берутся в кавычки, поэтому операторы FTS5 в тексте не действуют.
+    Возвращает None, если в тексте нет слов.
+    """
+    tokens = _TOKEN_RE.findall(text or '')
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _highlight(text):
+    return escape(text).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def matching_ids(kind, query):
+    """Подзапрос id объектов типа kind, подходящих под запрос FTS5, для pk__in"""
+    code = SEARCH_KINDS[kind][0]
+    return RawSQL(
+        f'SELECT rowid / 4 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND rowid %% 4 = %s',
+        [query, code]
+    )
+
+
+def find_matches(query, scopes, limit, offset=0):
+    """Совпадения, отсортированные по bm25 (заголовок весит больше текста).
+    
+    scopes - {тип: queryset видимых объектов или None, если видны все};
+    типы вне scopes не ищутся. Возвращает словари type, id, title, snippet,
+    score; title и snippet - экранированный HTML с совпадениями в <mark>.
+    """
+    conditions, params = [], [query]
+    for kind, queryset in scopes.items():
+        condition = f'{SEARCH_TABLE}.rowid %% 4 = {SEARCH_KINDS[kind][0]}'
+        if queryset is not None:
+            try:
+                visible_sql, visible_params = queryset.values('id').query.sql_with_params()
+            except EmptyResultSet:
+                continue
+            condition += f' AND {SEARCH_TABLE}.rowid / 4 IN ({visible_sql})'
+            params.extend(visible_params)
+        conditions.append(f'({condition})')
+    if not conditions:
+        return []
+    params.extend([limit, offset])
+    sql = (
+        f"SELECT rowid, bm25({SEARCH_TABLE}, 10.0, 1.0) AS rank, "
+        f"highlight({SEARCH_TABLE}, 0, '{_MARK_START}', '{_MARK_END}'), "
+        f"snippet({SEARCH_TABLE}, 1, '{_MARK_START}', '{_MARK_END}', '…', 16) "
+        f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND ({' OR '.join(conditions)}) "
+        f"ORDER BY rank LIMIT %s OFFSET %s"
+    )
+    kinds = {code: kind for kind, (code, *columns) in SEARCH_KINDS.items()}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            {
+                'type': kinds[rowid % 4],
+                'id': rowid // 4,
+                'title': _highlight(title),
+                'snippet': _highlight(snippet),
+                'score': round(-rank, 6),
+            }
+            for rowid, rank, title, snippet in cursor.fetchall()
+        ]
@@ -0,0 +1,104 @@
+"""
+Сводная статистика по задачам для HTML-страниц и API.
+
+Все счетчики считаются одним запросом с GROUP BY по проекту и условными
+COUNT; итоги по статусам и приоритетам складываются из строк проектов.
+Кэш учитывает область видимости пользователя и версию данных, которую
+сигналы из projects.models увеличивают при любом изменении задач, проектов
+и комментариев.
+"""
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from accounts.roles import role_of
+
+DATA_VERSION_KEY = 'projects.data_version'
+
+
+def data_version():
+    """Текущая версия данных задач и проектов"""
+    # Начальное значение от времени: после вытеснения ключа из кэша
+    # версия не повторит уже использованную
+    return cache.get_or_set(DATA_VERSION_KEY, lambda: time.time_ns(), None)
+
+
+def bump_data_version():
+    """Делает устаревшими все закэшированные сводки"""
+    try:
+        cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        data_version()
+
+
+def stats_scope(user):
+    """Ключ области видимости: задачи менеджеров и администраторов общие"""
+    if role_of(user).can_manage:
+        return 'all'
+    return f'user:{user.pk}'
+
+
+def task_stats(queryset):
+    """Счетчики задач queryset по статусам, приоритетам, проектам и просрочке"""
+    model = queryset.model
+    statuses = [value for value, label in model.STATUS_CHOICES]
+    priorities = [value for value, label in model.PRIORITY_CHOICES]
+    overdue = model.overdue_q()
+    rows = queryset.order_by('project').values('project', 'project__title').annotate(
+        total=Count('id'),
+        overdue=Count('id', filter=overdue),
+        **{f'status_{value}': Count('id', filter=Q(status=value)) for value in statuses},
+        **{f'priority_{value}': Count('id', filter=Q(priority=value)) for value in priorities},
+    )
+    
+    stats = {
+        'total': 0,
+        'overdue': 0,
+        'by_status': dict.fromkeys(statuses, 0),
+        'by_priority': dict.fromkeys(priorities, 0),
+        'by_project': [],
+    }
+    for row in rows:
+        by_status = {value: row[f'status_{value}'] for value in statuses}
+        stats['total'] += row['total']
+        stats['overdue'] += row['overdue']
+        for value in statuses:
+            stats['by_status'][value] += by_status[value]
+        for value in priorities:
+            stats['by_priority'][value] += row[f'priority_{value}']
+        stats['by_project'].append({
+            'project': row['project'],
+            'project_title': row['project__title'],
+            'total': row['total'],
+            'overdue': row['overdue'],
+            'by_status': by_status,
+        })
+    return stats
+
+
+def status_counts(queryset):
+    """Итог, просроченные и счетчики по статусам одним агрегатом без GROUP BY"""
+    statuses = [value for value, label in queryset.model.STATUS_CHOICES]
+    counts = queryset.order_by().aggregate(
+        total=Count('id'),
+        overdue=Count('id', filter=queryset.model.overdue_q()),
+        **{f'status_{value}': Count('id', filter=Q(status=value)) for value in statuses},
+    )
+    return {
+        'total': counts['total'],
+        'overdue': counts['overdue'],
+        'by_status': {value: counts[f'status_{value}'] for value in statuses},
+    }
+
+
+def cached_task_stats(queryset, scope):
+    """task_stats с кэшем по области видимости, версии данных и дате"""
+    key = f'projects.stats:{scope}:{data_version()}:{date.today().isoformat()}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = task_stats(queryset)
+        cache.set(key, stats, settings.TASK_STATS_CACHE_TIMEOUT)
+    return stats
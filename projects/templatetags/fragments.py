@@ -0,0 +1,43 @@
+from django import template
+
+from ..fragments import cached_fragment
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, obj, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.obj = obj
+        self.vary_on = vary_on
+
+    def render(self, context):
+        role = context.get('role')
+        return cached_fragment(
+            self.name.resolve(context), self.obj.resolve(context), getattr(role, 'name', None) or 'anonymous',
+            lambda: self.nodelist.render(context),
+            [var.resolve(context) for var in self.vary_on],
+        )
+
+
+@register.tag
+def cachefragment(parser, token):
+    """
+    Кэширует содержимое для объекта с учетом updated_at, версии и роли;
+    дополнительные аргументы тоже входят в ключ, как в {% cache %}:
+
+        {% cachefragment 'task_row' task task.project.updated_at %} ... {% endcachefragment %}
+
+    Внутри не должно быть ничего, что зависит от конкретного пользователя,
+    кроме его роли.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name and an object")
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    return FragmentNode(
+        nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
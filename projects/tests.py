@@ -1,8 +1,24 @@
-from django.test import TestCase, Client
+from datetime import date, timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from asgiref.sync import iscoroutinefunction
+
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase, Client, RequestFactory
 from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
 from django.urls import reverse
-from .models import Project, Task, Comment
+from .dashboard import build_dashboard, cached_dashboard
+from .fragments import fragment_stats, reset_fragment_stats, version_key
+from .models import Project, Task, Comment, Tombstone
+from .search import match_query, matching_ids
+from .stats import cached_task_stats, data_version, stats_scope, status_counts, task_stats
 from accounts.models import UserProfile
+from project_manager.query_budget import QueryBudgetMiddleware, QueryBudgetTestMixin, QueryRecorder, fingerprint
 
 class ProjectModelTests(TestCase):
     def setUp(self):
@@ -140,4 +156,617 @@ class TaskAccessTests(TestCase):
         
         # Проверяем, что статус изменился
         task.refresh_from_db()
-        self.assertEqual(task.status, 'done')
\ No newline at end of file
+        self.assertEqual(task.status, 'done')
+
+class TombstoneTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='test123')
+        self.project = Project.objects.create(title='Test Project', created_by=self.user)
+        self.task = Task.objects.create(
+            title='Test Task', project=self.project, assigned_to=self.user, created_by=self.user
+        )
+        self.comment = Comment.objects.create(task=self.task, author=self.user, content='Test')
+
+    def test_cascade_delete_records_tombstones(self):
+        """Тест записи удалений при каскадном удалении проекта"""
+        project_id, task_id, comment_id = self.project.id, self.task.id, self.comment.id
+        self.project.delete()
+        tombstones = set(Tombstone.objects.values_list('model', 'object_id'))
+        self.assertEqual(tombstones, {
+            ('project', project_id), ('task', task_id), ('comment', comment_id)
+        })
+        self.assertEqual(Tombstone.objects.get(model='task').assigned_to_id, self.user.id)
+
+class TaskStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.project = Project.objects.create(title='Project A', description='', created_by=self.manager)
+        other = Project.objects.create(title='Project B', description='', created_by=self.manager)
+        yesterday = date.today() - timedelta(days=1)
+        Task.objects.create(title='T1', description='', project=self.project, created_by=self.manager,
+                            status='done', priority='high', due_date=yesterday)
+        Task.objects.create(title='T2', description='', project=self.project, created_by=self.manager,
+                            status='todo', priority='high', due_date=yesterday, assigned_to=self.user)
+        Task.objects.create(title='T3', description='', project=other, created_by=self.manager,
+                            status='in_progress', priority='low')
+
+    def test_stats_single_query(self):
+        """Тест: все счетчики считаются одним запросом"""
+        with self.assertNumQueries(1):
+            result = task_stats(Task.objects.all())
+        self.assertEqual(result['total'], 3)
+        self.assertEqual(result['overdue'], 1)
+        self.assertEqual(result['by_status'], {'todo': 1, 'in_progress': 1, 'review': 0, 'done': 1})
+        self.assertEqual(result['by_priority'], {'low': 1, 'medium': 0, 'high': 2})
+        self.assertEqual([row['total'] for row in result['by_project']], [2, 1])
+        self.assertEqual(result['by_project'][0]['project_title'], 'Project A')
+
+    def test_cache_invalidated_on_change(self):
+        """Тест: кэш сбрасывается при изменении задач"""
+        cached_task_stats(Task.objects.all(), 'all')
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_task_stats(Task.objects.all(), 'all')['total'], 3)
+        Task.objects.create(title='T4', description='', project=self.project, created_by=self.manager)
+        self.assertEqual(cached_task_stats(Task.objects.all(), 'all')['total'], 4)
+
+    def test_scope_by_role(self):
+        """Тест: менеджеры делят общую область, пользователи - свою"""
+        self.assertEqual(stats_scope(self.manager), 'all')
+        self.assertEqual(stats_scope(self.user), f'user:{self.user.pk}')
+
+    def test_task_list_view_counts(self):
+        """Тест счетчиков на странице задач"""
+        self.client.login(username='manager', password='manager123')
+        response = self.client.get(reverse('task_list'))
+        self.assertEqual(response.context['tasks_total_count'], 3)
+        self.assertEqual(response.context['tasks_done_count'], 1)
+        self.assertEqual(response.context['tasks_in_progress_count'], 1)
+        self.assertEqual(response.context['tasks_todo_count'], 1)
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.project = Project.objects.create(title='Project A', description='', created_by=self.manager)
+        Project.objects.create(title='Archived', description='', created_by=self.manager, status='completed')
+        self.yesterday = date.today() - timedelta(days=1)
+        self.task = Task.objects.create(title='Mine', description='', project=self.project, created_by=self.manager,
+                                        assigned_to=self.user, due_date=self.yesterday)
+        Task.objects.create(title='Done', description='', project=self.project, created_by=self.manager,
+                            assigned_to=self.user, status='done')
+        Comment.objects.create(task=self.task, author=self.manager, content='Когда будет готово?')
+
+    def add_tasks(self, count):
+        for i in range(count):
+            task = Task.objects.create(title=f'Extra {i}', description='', project=self.project,
+                                       created_by=self.manager, assigned_to=self.user, due_date=self.yesterday)
+            Comment.objects.create(task=task, author=self.manager, content='...')
+
+    def test_dashboard_content(self):
+        """Тест: дашборд собирает мои задачи, просрочку, счетчики, комментарии и проекты"""
+        data = build_dashboard(User.objects.get(pk=self.user.pk))
+        self.assertEqual([task['title'] for task in data['my_tasks']], ['Mine'])
+        self.assertEqual(data['my_tasks'][0]['project_title'], 'Project A')
+        self.assertEqual([task['title'] for task in data['overdue_tasks']], ['Mine'])
+        self.assertEqual(data['status_counts']['done'], 1)
+        self.assertEqual(data['overdue_count'], 1)
+        self.assertEqual(data['recent_comments'][0]['author_name'], 'manager')
+        self.assertEqual([(p['title'], p['open_tasks']) for p in data['active_projects']], [('Project A', 1)])
+
+    def test_query_count_is_constant_and_lists_bounded(self):
+        """Тест: число запросов не зависит от объема данных, списки ограничены"""
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(6):
+            build_dashboard(user)
+        self.add_tasks(15)
+        cache.clear()
+        user = User.objects.get(pk=self.user.pk)
+        with self.settings(DASHBOARD_LIMIT=5), self.assertNumQueries(6):
+            data = build_dashboard(user)
+        self.assertEqual(len(data['my_tasks']), 5)
+        self.assertEqual(len(data['recent_comments']), 5)
+
+    def test_cache_invalidated_on_change(self):
+        """Тест: кэш дашборда сбрасывается при изменении задач и комментариев"""
+        cached_dashboard(self.user)
+        with self.assertNumQueries(0):
+            cached_dashboard(self.user)
+        Comment.objects.create(task=self.task, author=self.manager, content='Новый')
+        self.assertEqual(cached_dashboard(self.user)['recent_comments'][0]['content'], 'Новый')
+        self.task.delete()
+        self.assertEqual(cached_dashboard(self.user)['my_tasks'], [])
+
+    def test_home_page_renders_dashboard(self):
+        """Тест: главная страница строится из тех же данных"""
+        client = Client()
+        self.assertEqual(client.get(reverse('home')).status_code, 200)
+        client.login(username='user', password='user123')
+        response = client.get(reverse('home'))
+        self.assertContains(response, 'Мои задачи')
+        self.assertContains(response, 'Когда будет готово?')
+        self.assertEqual(response.context['dashboard']['my_tasks'][0]['id'], self.task.pk)
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        for i in range(4):
+            project = Project.objects.create(title=f'Project {i}', description='', created_by=self.manager)
+            self.task = Task.objects.create(title=f'Task {i}', description='', project=project,
+                                            created_by=self.manager, assigned_to=self.manager)
+        self.project = project
+
+    def test_recorder_detects_repeated_queries(self):
+        """Тест: одинаковые запросы для каждой строки распознаются как N+1"""
+        with QueryRecorder() as recorder:
+            titles = [task.project.title for task in Task.objects.all()]
+        self.assertEqual(recorder.count, 5)
+        self.assertGreaterEqual(recorder.total_time, 0)
+        self.assertEqual(list(recorder.repeated().values()), [4])
+        with QueryRecorder() as recorder:
+            titles = [task.project.title for task in Task.objects.select_related('project')]
+        self.assertEqual(len(titles), 4)
+        self.assertEqual(recorder.repeated(), {})
+
+    def test_fingerprint_ignores_in_list_length(self):
+        """Тест: списки IN разной длины дают один отпечаток"""
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+            fingerprint('SELECT *  FROM t\nWHERE id IN (%s)'),
+        )
+
+    def test_middleware_reports_queries(self):
+        """Тест: middleware добавляет заголовки и предупреждает о превышении бюджета"""
+        self.client.force_login(self.manager)
+        with self.settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGETS={'home': 1}):
+            with self.assertLogs('project_manager.query_budget', 'WARNING') as logs:
+                response = self.client.get(reverse('home'))
+        self.assertIn('X-Query-Count', response)
+        self.assertIn('Query budget exceeded in home', logs.output[0])
+
+    async def test_middleware_async_chain(self):
+        """Тест: под ASGI middleware остается асинхронной и считает запросы async ORM"""
+        async def get_response(request):
+            await Project.objects.acount()
+            return HttpResponse()
+        
+        with self.settings(QUERY_BUDGET_ENABLED=True):
+            middleware = QueryBudgetMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/'))
+        self.assertEqual(response['X-Query-Count'], '1')
+
+    def test_pages_budget(self):
+        """Тест: страницы проектов и задач укладываются в бюджет запросов"""
+        self.client.force_login(self.manager)
+        self.assertQueryBudget('home')
+        self.assertQueryBudget('project_create')
+        self.assertQueryBudget('project_update', args=[self.project.pk])
+        self.assertQueryBudget('task_create')
+        self.assertQueryBudget('task_update', args=[self.task.pk])
+
+class ProjectListViewTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.other = User.objects.create_user(username='other', password='other123')
+        self.other.userprofile.role = 'manager'
+        self.other.userprofile.save()
+        self.project = Project.objects.create(title='Main', description='Длинное описание ' * 100,
+                                              created_by=self.manager)
+        for task_status in ['done', 'done', 'todo']:
+            Task.objects.create(title='T', description='', project=self.project, created_by=self.manager,
+                                status=task_status)
+        Project.objects.create(title='Paused', description='', created_by=self.other, status='on_hold')
+        self.client.force_login(self.manager)
+
+    def test_counts_annotated(self):
+        """Тест: счетчики задач приходят из основного запроса, описание не читается"""
+        response = self.client.get(reverse('project_list'))
+        project = next(p for p in response.context['projects'] if p.pk == self.project.pk)
+        self.assertEqual((project.task_count, project.done_count, project.open_count), (3, 2, 1))
+        self.assertIn('description', project.get_deferred_fields())
+        self.assertContains(response, 'width: 67%')
+
+    def test_budget_does_not_grow_with_projects(self):
+        """Тест: число запросов не зависит от числа проектов на странице"""
+        for i in range(10):
+            Project.objects.create(title=f'P{i}', description='', created_by=self.other)
+        self.assertQueryBudget('project_list')
+
+    def test_filters_and_pagination(self):
+        """Тест: фильтры по статусу и создателю, постраничный вывод"""
+        response = self.client.get(reverse('project_list'), {'status': 'on_hold'})
+        self.assertEqual([p.title for p in response.context['projects']], ['Paused'])
+        response = self.client.get(reverse('project_list'), {'owner': 'me'})
+        self.assertEqual([p.title for p in response.context['projects']], ['Main'])
+        response = self.client.get(reverse('project_list'), {'owner': self.other.pk})
+        self.assertEqual([p.title for p in response.context['projects']], ['Paused'])
+        with self.settings(PROJECT_LIST_PAGE_SIZE=1):
+            response = self.client.get(reverse('project_list'), {'status': 'active', 'page': 1})
+            self.assertEqual(response.context['page_obj'].paginator.num_pages, 1)
+            response = self.client.get(reverse('project_list'), {'page': 2})
+        self.assertEqual([p.title for p in response.context['projects']], ['Main'])
+        self.assertContains(response, '2 из 2')
+
+    def test_status_filter_uses_index(self):
+        """Тест: фильтр по статусу использует составной индекс"""
+        plan = Project.objects.filter(status='active').order_by('-updated_at', '-id').explain()
+        self.assertIn('project_status_updated_idx', plan)
+
+class TaskListViewTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.project = Project.objects.create(title='Main', description='', created_by=self.manager)
+        self.other = Project.objects.create(title='Other', description='', created_by=self.manager)
+        yesterday = date.today() - timedelta(days=1)
+        Task.objects.create(title='Overdue', description='Описание ' * 100, project=self.project,
+                            created_by=self.manager, assigned_to=self.user, priority='high', due_date=yesterday)
+        Task.objects.create(title='Done', description='', project=self.project, created_by=self.manager,
+                            assigned_to=self.user, status='done', due_date=yesterday)
+        Task.objects.create(title='Free', description='', project=self.other, created_by=self.manager,
+                            status='in_progress')
+        self.client.force_login(self.manager)
+
+    def titles(self, response):
+        return sorted(task.title for task in response.context['tasks'])
+
+    def test_filters(self):
+        """Тест: фильтры по статусу, приоритету, проекту, исполнителю и просрочке"""
+        url = reverse('task_list')
+        self.assertEqual(self.titles(self.client.get(url, {'status': 'done'})), ['Done'])
+        self.assertEqual(self.titles(self.client.get(url, {'priority': 'high'})), ['Overdue'])
+        self.assertEqual(self.titles(self.client.get(url, {'project': self.other.pk})), ['Free'])
+        self.assertEqual(self.titles(self.client.get(url, {'assigned_to': 'none'})), ['Free'])
+        self.assertEqual(self.titles(self.client.get(url, {'assigned_to': self.user.pk})), ['Done', 'Overdue'])
+        self.assertEqual(self.titles(self.client.get(url, {'overdue': '1'})), ['Overdue'])
+        self.assertEqual(self.titles(self.client.get(url, {'status': 'bogus'})), ['Done', 'Free', 'Overdue'])
+
+    def test_stats_over_filtered_set(self):
+        """Тест: статистика считается по отфильтрованной выборке одним запросом"""
+        response = self.client.get(reverse('task_list'), {'project': self.project.pk})
+        self.assertEqual(response.context['tasks_total_count'], 2)
+        self.assertEqual(response.context['tasks_done_count'], 1)
+        self.assertEqual(response.context['tasks_overdue_count'], 1)
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+        with self.assertNumQueries(1):
+            counts = status_counts(Task.objects.filter(project=self.project))
+        self.assertEqual(counts['by_status']['todo'], 1)
+
+    def test_pagination_and_budget(self):
+        """Тест: постраничный вывод, число запросов не зависит от числа задач"""
+        for i in range(20):
+            Task.objects.create(title=f'Extra {i}', description='', project=self.other,
+                                created_by=self.manager, assigned_to=self.manager)
+        with self.settings(TASK_LIST_PAGE_SIZE=10):
+            response = self.assertQueryBudget('task_list')
+            self.assertEqual(len(response.context['tasks']), 10)
+            self.assertEqual(response.context['page_obj'].paginator.num_pages, 3)
+            response = self.assertQueryBudget('task_list', data={'assigned_to': 'me', 'page': 2})
+        self.assertEqual(len(response.context['tasks']), 10)
+        self.assertIn('description', response.context['tasks'][0].get_deferred_fields())
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        caches['fragments'].clear()
+        reset_fragment_stats()
+        self.manager = User.objects.create_user(username='manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.other = User.objects.create_user(username='other', password='other123')
+        self.project = Project.objects.create(title='Main', description='', created_by=self.manager)
+        self.task = Task.objects.create(title='Task', description='', project=self.project,
+                                        created_by=self.manager, assigned_to=self.user)
+
+    def test_repeated_render_hits_cache(self):
+        """Тест: повторный вывод списков берет карточки и строки из кэша"""
+        self.client.force_login(self.manager)
+        first = self.client.get(reverse('task_list')).content
+        self.assertEqual(self.client.get(reverse('task_list')).content, first)
+        self.client.get(reverse('project_list'))
+        self.client.get(reverse('project_list'))
+        stats = fragment_stats()
+        self.assertEqual(stats['task_row'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+        self.assertEqual(stats['project_card']['hits'], 1)
+
+    def test_changes_invalidate_fragments(self):
+        """Тест: изменения задач и проектов сбрасывают их фрагменты"""
+        self.client.force_login(self.manager)
+        self.client.get(reverse('task_list'))
+        self.client.get(reverse('project_list'))
+        self.task.title = 'Renamed'
+        self.task.save()
+        self.assertContains(self.client.get(reverse('task_list')), 'Renamed')
+        Task.objects.create(title='Second', description='', project=self.project, created_by=self.manager,
+                            status='done')
+        self.assertContains(self.client.get(reverse('project_list')), 'Задач: 2, открыто: 1, выполнено: 1')
+        self.project.title = 'Main renamed'
+        self.project.save()
+        self.assertContains(self.client.get(reverse('task_list')), 'Main renamed')
+
+    def test_moving_task_invalidates_old_project(self):
+        """Тест: перенос задачи обновляет карточки обоих проектов"""
+        other = Project.objects.create(title='Other', description='', created_by=self.manager)
+        self.client.force_login(self.manager)
+        self.client.get(reverse('project_list'))
+        task = Task.objects.get(pk=self.task.pk)
+        task.project = other
+        task.save()
+        response = self.client.get(reverse('project_list'))
+        self.assertContains(response, 'Задач: 0, открыто: 0, выполнено: 0')
+        self.assertContains(response, 'Задач: 1, открыто: 1, выполнено: 0')
+        self.assertEqual(fragment_stats()['project_card']['hits'], 0)
+
+    def test_fragments_vary_by_role_only(self):
+        """Тест: кнопки по роли кэшируются, кнопка завершения - нет"""
+        self.client.force_login(self.manager)
+        self.assertContains(self.client.get(reverse('task_list')), 'Редактировать')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('task_list'))
+        self.assertNotContains(response, 'Редактировать')
+        self.assertContains(response, 'Завершить')
+        self.client.force_login(self.other)
+        self.assertNotContains(self.client.get(reverse('task_list')), 'Завершить')
+        self.assertEqual(fragment_stats()['task_row']['hits'], 1)
+
+class OverdueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['fragments'].clear()
+        self.manager = User.objects.create_user(username='manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.project = Project.objects.create(title='Main', description='', created_by=self.manager)
+        yesterday = date.today() - timedelta(days=1)
+        self.overdue = Task.objects.create(title='Late', description='', project=self.project,
+                                           created_by=self.manager, due_date=yesterday)
+        Task.objects.create(title='Done late', description='', project=self.project, created_by=self.manager,
+                            due_date=yesterday, status='done')
+        self.future = Task.objects.create(title='Future', description='', project=self.project,
+                                          created_by=self.manager, due_date=date.today() + timedelta(days=1))
+        Task.objects.create(title='No date', description='', project=self.project, created_by=self.manager)
+
+    def test_annotation_matches_python(self):
+        """Тест: is_overdue из SQL совпадает с вычислением по полям"""
+        annotated = {task.pk: task.is_overdue for task in Task.objects.with_overdue()}
+        computed = {task.pk: task.is_overdue for task in Task.objects.all()}
+        self.assertEqual(annotated, computed)
+        self.assertEqual([pk for pk, value in annotated.items() if value], [self.overdue.pk])
+        self.assertEqual(list(Task.objects.overdue()), [self.overdue])
+
+    def test_overdue_uses_partial_index(self):
+        """Тест: выборка просроченных задач идет по частичному индексу"""
+        self.assertIn('task_overdue_idx', Task.objects.overdue().explain())
+
+    def test_task_list_marks_overdue_rows(self):
+        """Тест: строки списка задач отмечают просрочку, кэш фрагмента ее учитывает"""
+        self.client.force_login(self.manager)
+        self.assertContains(self.client.get(reverse('task_list')), 'Просрочена', count=1)
+        Task.objects.filter(pk=self.future.pk).update(due_date=date.today() - timedelta(days=2))
+        response = self.client.get(reverse('task_list'), {'overdue': '1'})
+        self.assertContains(response, 'Просрочена', count=2)
+        self.assertEqual(response.context['tasks_overdue_count'], 2)
+
+class BoardTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['fragments'].clear()
+        self.manager = User.objects.create_user(username='manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.project = Project.objects.create(title='Main', description='', created_by=self.manager)
+        self.todo = Task.objects.create(title='Todo', description='', project=self.project,
+                                        created_by=self.manager, assigned_to=self.user)
+        self.other = Task.objects.create(title='Other', description='', project=self.project,
+                                         created_by=self.manager, status='in_progress')
+        Task.objects.create(title='Done', description='', project=self.project, created_by=self.manager, status='done')
+
+    def move(self, task, status, version=None):
+        return self.client.post(
+            reverse('task_move', args=[task.pk]),
+            {'status': status, 'version': version or task.updated_at.isoformat()},
+            content_type='application/json'
+        )
+
+    def test_board_groups_tasks_by_status(self):
+        """Тест: доска загружается одним запросом к задачам и раскладывает их по колонкам"""
+        self.client.force_login(self.manager)
+        response = self.assertQueryBudget('project_board', args=[self.project.pk])
+        columns = {column['status']: [task['title'] for task in column['tasks']] for column in response.context['columns']}
+        self.assertEqual(columns, {'todo': ['Todo'], 'in_progress': ['Other'], 'review': [], 'done': ['Done']})
+        self.assertContains(response, 'draggable="true"', count=3)
+        self.assertContains(response, 'board-column board-drop', count=4)
+        
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('project_board', args=[self.project.pk]))
+        self.assertContains(response, 'draggable="true"', count=1)
+        self.assertContains(response, 'board-column board-drop', count=1)
+
+    def test_board_column_limit(self):
+        """Тест: колонка ограничена BOARD_COLUMN_LIMIT, полное число задач сохраняется"""
+        Task.objects.create(title='Newer', description='', project=self.project, created_by=self.manager)
+        self.client.force_login(self.manager)
+        with self.settings(BOARD_COLUMN_LIMIT=1):
+            response = self.client.get(reverse('project_board', args=[self.project.pk]))
+        todo = next(column for column in response.context['columns'] if column['status'] == 'todo')
+        self.assertEqual([task['title'] for task in todo['tasks']], ['Newer'])
+        self.assertEqual(todo['total'], 2)
+
+    def test_board_for_user_shows_assigned_tasks(self):
+        """Тест: пользователь видит на доске только назначенные ему задачи"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('project_board', args=[self.project.pk]))
+        tasks = [task['title'] for column in response.context['columns'] for task in column['tasks']]
+        self.assertEqual(tasks, ['Todo'])
+
+    def test_move_updates_status_in_one_query(self):
+        """Тест: перенос карточки - один UPDATE, ответ с новым статусом и версией"""
+        self.client.force_login(self.manager)
+        old_version = data_version()
+        with QueryRecorder() as recorder:
+            response = self.move(self.todo, 'in_progress')
+        updates = [sql for sql, duration in recorder.queries if sql.startswith('UPDATE')]
+        self.assertEqual(response.status_code, 200)
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.status, 'in_progress')
+        self.assertEqual(response.json(), {
+            'id': self.todo.pk, 'status': 'in_progress', 'version': self.todo.updated_at.isoformat(),
+        })
+        self.assertEqual(len(updates), 1)
+        self.assertNotEqual(data_version(), old_version)
+        self.assertIsNotNone(caches['fragments'].get(version_key('project', self.project.pk)))
+
+    def test_move_with_stale_version_conflicts(self):
+        """Тест: перенос по устаревшей версии возвращает 409 и текущее состояние"""
+        self.client.force_login(self.manager)
+        version = self.todo.updated_at.isoformat()
+        self.todo.status = 'done'
+        self.todo.save()
+        response = self.move(self.todo, 'in_progress', version)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], 'done')
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.status, 'done')
+
+    def test_move_access(self):
+        """Тест: пользователь только завершает назначенные ему задачи"""
+        self.client.force_login(self.user)
+        self.assertEqual(self.move(self.other, 'done').status_code, 404)
+        self.assertEqual(self.move(self.todo, 'in_progress').status_code, 403)
+        self.assertEqual(self.move(self.todo, 'done').status_code, 200)
+        self.todo.refresh_from_db()
+        # Вернуть выполненную задачу назад пользователь не может
+        self.assertEqual(self.move(self.todo, 'todo').status_code, 403)
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.status, 'done')
+        self.client.logout()
+        self.assertEqual(self.move(self.todo, 'todo').status_code, 302)
+
+    def test_move_validates_input(self):
+        """Тест: неизвестный статус, битая версия и GET отклоняются"""
+        self.client.force_login(self.manager)
+        self.assertEqual(self.move(self.todo, 'archived').status_code, 400)
+        self.assertEqual(self.move(self.todo, 'done', 'yesterday').status_code, 400)
+        for status in (['done'], {'done': 1}, None, 1):
+            self.assertEqual(self.move(self.todo, status).status_code, 400)
+        response = self.client.post(reverse('task_move', args=[self.todo.pk]), ['done'], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('task_move', args=[self.todo.pk])).status_code, 405)
+
+class TaskDetailPartialTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='manager123')
+        self.manager.userprofile.role = 'manager'
+        self.manager.userprofile.save()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.other = User.objects.create_user(username='other', password='other123')
+        self.project = Project.objects.create(title='Main', description='', created_by=self.manager)
+        self.task = Task.objects.create(title='Task', description='', project=self.project,
+                                        created_by=self.manager, assigned_to=self.user)
+        for author in (self.manager, self.user, self.other):
+            Comment.objects.create(task=self.task, author=author, content=f'From {author.username}')
+
+    def test_detail_page_budget(self):
+        """Тест: страница задачи с комментариями укладывается в бюджет без N+1"""
+        self.client.force_login(self.user)
+        response = self.assertQueryBudget('task_detail', args=[self.task.pk])
+        self.assertContains(response, 'From other')
+        self.assertContains(response, 'id="task-complete"')
+
+    def test_partial_comment(self):
+        """Тест: с X-Partial комментарий возвращается одним фрагментом без страницы"""
+        self.client.force_login(self.user)
+        with QueryRecorder() as recorder:
+            response = self.client.post(reverse('task_detail', args=[self.task.pk]), {'content': 'Partial'},
+                                        HTTP_X_PARTIAL='1')
+        self.assertEqual(response.status_code, 201)
+        self.assertContains(response, 'Partial', status_code=201)
+        self.assertNotContains(response, '<html', status_code=201)
+        self.assertNotContains(response, 'From other', status_code=201)
+        self.assertLessEqual(recorder.count, 4)
+        self.assertTrue(self.task.comments.filter(content='Partial', author=self.user).exists())
+        self.assertFalse(list(get_messages(response.wsgi_request)))
+
+    def test_partial_comment_invalid(self):
+        """Тест: пустой комментарий с X-Partial возвращает форму с ошибкой и 400"""
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('task_detail', args=[self.task.pk]), {'content': ''}, HTTP_X_PARTIAL='1')
+        self.assertContains(response, 'id="comment-form"', status_code=400)
+        self.assertEqual(self.task.comments.count(), 3)
+
+    def test_full_page_fallback(self):
+        """Тест: без X-Partial комментарий и завершение работают через редирект"""
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('task_detail', args=[self.task.pk]), {'content': 'Full'})
+        self.assertRedirects(response, reverse('task_detail', args=[self.task.pk]))
+        response = self.client.post(reverse('task_complete', args=[self.task.pk]))
+        self.assertRedirects(response, reverse('task_detail', args=[self.task.pk]))
+
+    def test_partial_complete(self):
+        """Тест: с X-Partial завершение возвращает только бейдж статуса"""
+        self.client.force_login(self.other)
+        response = self.client.post(reverse('task_complete', args=[self.task.pk]), HTTP_X_PARTIAL='1')
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('task_complete', args=[self.task.pk]), HTTP_X_PARTIAL='1')
+        self.assertContains(response, 'id="task-status"')
+        self.assertContains(response, 'Выполнено')
+        self.assertNotContains(response, '<html')
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'done')
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 есть только в SQLite')
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='root', password='root123', email='')
+        self.project = Project.objects.create(title='Миграция базы', description='Перенос данных', created_by=self.admin)
+        self.task = Task.objects.create(title='Резервное копирование', description='Каждую ночь',
+                                        project=self.project, created_by=self.admin)
+        self.comment = Comment.objects.create(task=self.task, author=self.admin, content='Копии на отдельном диске')
+
+    def ids(self, kind, text):
+        model = {'project': Project, 'task': Task, 'comment': Comment}[kind]
+        return list(model.objects.filter(pk__in=matching_ids(kind, match_query(text))).values_list('id', flat=True))
+
+    def test_index_follows_changes(self):
+        """Тест: индекс обновляется при создании, изменении и удалении"""
+        self.assertEqual(self.ids('task', 'резерв'), [self.task.id])
+        self.assertEqual(self.ids('comment', 'диск'), [self.comment.id])
+        Task.objects.filter(pk=self.task.pk).update(description='Архив журналов')
+        self.assertEqual(self.ids('task', 'журнал'), [self.task.id])
+        self.assertEqual(self.ids('task', 'ночь'), [])
+        self.project.delete()
+        self.assertEqual(self.ids('project', 'миграция'), [])
+        self.assertEqual(self.ids('comment', 'диск'), [])
+
+    def test_rebuild_command(self):
+        """Тест перестройки индекса порциями"""
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM projects_search')
+        self.assertEqual(self.ids('project', 'миграция'), [])
+        call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.ids('project', 'миграция'), [self.project.id])
+        self.assertEqual(self.ids('comment', 'копии'), [self.comment.id])
+
+    def test_admin_search(self):
+        """Тест поиска в админке через индекс"""
+        self.client.login(username='root', password='root123')
+        response = self.client.get(reverse('admin:projects_task_changelist'), {'q': 'резервн'})
+        self.assertEqual(list(response.context['cl'].queryset), [self.task])
+        response = self.client.get(reverse('admin:projects_comment_changelist'), {'q': 'root'})
+        self.assertEqual(list(response.context['cl'].queryset), [self.comment])
@@ -6,6 +6,7 @@ urlpatterns = [
     path('', views.project_list, name='project_list'),
     path('<int:pk>/', views.project_detail, name='project_detail'),
     path('create/', views.project_create, name='project_create'),
+    path('<int:pk>/board/', views.project_board, name='project_board'),
     path('<int:pk>/update/', views.project_update, name='project_update'),
     path('<int:pk>/delete/', views.project_delete, name='project_delete'),
     
@@ -17,4 +18,5 @@ urlpatterns = [
     path('tasks/<int:pk>/update/', views.task_update, name='task_update'),
     path('tasks/<int:pk>/delete/', views.task_delete, name='task_delete'),
     path('tasks/<int:pk>/complete/', views.task_complete, name='task_complete'),
+    path('tasks/<int:pk>/move/', views.task_move, name='task_move'),
 ]
\ No newline at end of file
@@ -1,15 +1,78 @@
+import json
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponseForbidden
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber, Substr
+from django.http import HttpResponseForbidden, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_POST
 from .models import Project, Task, Comment
 from .forms import ProjectForm, TaskForm, CommentForm
+from .dashboard import cached_dashboard
+from .fragments import attach_fragment_versions, bump_fragment_versions
+from .stats import bump_data_version, cached_task_stats, status_counts
 from accounts.decorators import admin_required, manager_required
+from accounts.roles import get_role
+
+def home(request):
+    context = {}
+    if request.user.is_authenticated:
+        dashboard = cached_dashboard(request.user)
+        context['dashboard'] = dashboard
+        context['status_counts'] = [
+            (label, dashboard['status_counts'][value]) for value, label in Task.STATUS_CHOICES
+        ]
+    return render(request, 'home.html', context)
+
+def _page(request, queryset, per_page, count=None):
+    """Страница queryset и строка GET-параметров без page для ссылок пагинации.
+    
+    Если число объектов уже известно (count), отдельный COUNT(*) не выполняется.
+    """
+    params = request.GET.copy()
+    params.pop('page', None)
+    paginator = Paginator(queryset, per_page)
+    if count is not None:
+        paginator.count = count
+    return paginator.get_page(request.GET.get('page')), params.urlencode()
 
 @login_required
 def project_list(request):
-    projects = Project.objects.all()
-    return render(request, 'projects/project_list.html', {'projects': projects})
+    # Счетчики задач считаются в том же запросе, полное описание не читается
+    projects = Project.objects.select_related('created_by').defer('description').annotate(
+        description_excerpt=Substr('description', 1, 300),
+        task_count=Count('tasks'),
+        done_count=Count('tasks', filter=Q(tasks__status='done')),
+        open_count=Count('tasks', filter=~Q(tasks__status='done')),
+    ).order_by('-updated_at', '-id')
+    
+    # Фильтры по индексам (status, updated_at, id) и (created_by, updated_at, id)
+    status = request.GET.get('status', '')
+    if status in dict(Project.STATUS_CHOICES):
+        projects = projects.filter(status=status)
+    owner = request.GET.get('owner', '')
+    if owner == 'me':
+        projects = projects.filter(created_by=request.user)
+    elif owner.isdigit():
+        projects = projects.filter(created_by_id=owner)
+    
+    page, query = _page(request, projects, settings.PROJECT_LIST_PAGE_SIZE)
+    attach_fragment_versions(page.object_list)
+    return render(request, 'projects/project_list.html', {
+        'projects': page,
+        'page_obj': page,
+        'query': query,
+        'status': status,
+        'owner': owner,
+        'status_choices': Project.STATUS_CHOICES,
+        'owners': User.objects.filter(userprofile__role__in=['manager', 'admin']).order_by('username').values('id', 'username'),
+    })
 
 @login_required
 def project_detail(request, pk):
@@ -20,6 +83,78 @@ def project_detail(request, pk):
         'tasks': tasks
     })
 
+@login_required
+def project_board(request, pk):
+    """Канбан-доска проекта: колонки по статусам, одним запросом.
+    
+    В каждой колонке не больше BOARD_COLUMN_LIMIT последних измененных
+    задач; column_total - полное число задач в колонке.
+    """
+    project = get_object_or_404(Project, pk=pk)
+    order = [F('updated_at').desc(), F('id').desc()]
+    rows = Task.objects.visible_to(request.user).filter(project=project).with_overdue().annotate(
+        position=Window(RowNumber(), partition_by=F('status'), order_by=order),
+        column_total=Window(Count('id'), partition_by=F('status')),
+    ).filter(position__lte=settings.BOARD_COLUMN_LIMIT).order_by('status', *order).values(
+        'id', 'title', 'status', 'priority', 'due_date', 'assigned_to', 'updated_at', 'is_overdue',
+        'column_total', assignee=F('assigned_to__username'),
+    )
+    
+    columns = {value: {'status': value, 'label': label, 'tasks': [], 'total': 0} for value, label in Task.STATUS_CHOICES}
+    priorities = dict(Task.PRIORITY_CHOICES)
+    for row in rows:
+        row['version'] = row['updated_at'].isoformat()
+        row['priority_label'] = priorities[row['priority']]
+        column = columns[row['status']]
+        column['tasks'].append(row)
+        column['total'] = row['column_total']
+    return render(request, 'projects/project_board.html', {
+        'project': project,
+        'columns': columns.values(),
+    })
+
+@login_required
+@require_POST
+def task_move(request, pk):
+    """Смена статуса задачи с доски: один условный UPDATE.
+    
+    Тело - JSON или форма со status и version (updated_at, полученный с
+    доской). Если задачу успели изменить, возвращается 409 и текущая версия.
+    Менеджеры и администраторы переносят задачи между любыми статусами,
+    пользователи - как и task_complete, только завершают назначенные им.
+    """
+    try:
+        data = json.loads(request.body) if request.content_type == 'application/json' else request.POST
+    except ValueError:
+        data = None
+    new_status = data.get('status') if isinstance(data, dict) else None
+    version = data.get('version') if isinstance(data, dict) else None
+    try:
+        version = parse_datetime(version) if isinstance(version, str) else None
+    except ValueError:
+        version = None
+    if version is None or not isinstance(new_status, str) or new_status not in dict(Task.STATUS_CHOICES):
+        return JsonResponse({'error': 'Ожидаются status и version'}, status=400)
+    if not get_role(request).can_manage and new_status != 'done':
+        return JsonResponse({'error': 'Вы можете только завершить задачу'}, status=403)
+    
+    now = timezone.now()
+    tasks = Task.objects.completable_by(request.user).filter(pk=pk)
+    if tasks.filter(updated_at=version).update(status=new_status, updated_at=now):
+        # update() не отправляет post_save
+        bump_data_version()
+        bump_fragment_versions('project', tasks.values_list('project_id', flat=True))
+        return JsonResponse({'id': pk, 'status': new_status, 'version': now.isoformat()})
+    
+    # Задача недоступна пользователю или ее успели изменить
+    current = tasks.values('status', 'updated_at').first()
+    if current is None:
+        return JsonResponse({'error': 'Задача не найдена'}, status=404)
+    return JsonResponse(
+        {'error': 'Задача изменена', 'status': current['status'], 'version': current['updated_at'].isoformat()},
+        status=409
+    )
+
 @login_required
 @manager_required
 def project_create(request):
@@ -62,26 +197,80 @@ def project_delete(request, pk):
     
     return render(request, 'projects/project_confirm_delete.html', {'project': project})
 
+TASK_FILTERS = ('status', 'priority', 'project', 'assigned_to', 'overdue')
+
 @login_required
 def task_list(request):
-    tasks = Task.objects.all()
+    tasks = Task.objects.with_overdue().select_related('project', 'assigned_to').defer('description').annotate(
+        description_excerpt=Substr('description', 1, 200),
+    ).order_by('-created_at', '-id')
     
-    # Статистика для отображения в шаблоне
-    tasks_done_count = tasks.filter(status='done').count()
-    tasks_in_progress_count = tasks.filter(status='in_progress').count()
-    tasks_todo_count = tasks.filter(status='todo').count()
+    # Фильтры по индексам (status, due_date), (project, status), (assigned_to, status)
+    filters = {name: request.GET.get(name, '') for name in TASK_FILTERS}
+    if filters['status'] in dict(Task.STATUS_CHOICES):
+        tasks = tasks.filter(status=filters['status'])
+    if filters['priority'] in dict(Task.PRIORITY_CHOICES):
+        tasks = tasks.filter(priority=filters['priority'])
+    if filters['project'].isdigit():
+        tasks = tasks.filter(project_id=filters['project'])
+    if filters['assigned_to'] == 'me':
+        tasks = tasks.filter(assigned_to=request.user)
+    elif filters['assigned_to'] == 'none':
+        tasks = tasks.filter(assigned_to__isnull=True)
+    elif filters['assigned_to'].isdigit():
+        tasks = tasks.filter(assigned_to_id=filters['assigned_to'])
+    if filters['overdue']:
+        tasks = tasks.overdue()
+    
+    # Статистика: без фильтров - из кэша, с фильтрами - один агрегат по выборке;
+    # итог заодно служит числом объектов для пагинации
+    if any(filters.values()):
+        stats = status_counts(tasks)
+    else:
+        stats = cached_task_stats(Task.objects.all(), 'all')
+    page, query = _page(request, tasks, settings.TASK_LIST_PAGE_SIZE, count=stats['total'])
+    attach_fragment_versions(page.object_list)
     
     return render(request, 'tasks/task_list.html', {
-        'tasks': tasks,
-        'tasks_done_count': tasks_done_count,
-        'tasks_in_progress_count': tasks_in_progress_count,
-        'tasks_todo_count': tasks_todo_count,
+        'tasks': page,
+        'page_obj': page,
+        'query': query,
+        'filters': filters,
+        'status_choices': Task.STATUS_CHOICES,
+        'priority_choices': Task.PRIORITY_CHOICES,
+        'projects': Project.objects.order_by('title').values('id', 'title'),
+        'users': User.objects.order_by('username').values('id', 'username'),
+        'tasks_total_count': stats['total'],
+        'tasks_overdue_count': stats['overdue'],
+        'tasks_done_count': stats['by_status']['done'],
+        'tasks_in_progress_count': stats['by_status']['in_progress'],
+        'tasks_todo_count': stats['by_status']['todo'],
     })
 
+def _is_partial(request):
+    """Клиент просит только фрагмент HTML вместо полной страницы (заголовок X-Partial)"""
+    return request.headers.get('X-Partial', '').lower() in ('1', 'true')
+
+def _post_comment_fragment(request, pk):
+    """Новый комментарий фрагментом HTML (201) или форма с ошибками (400)"""
+    # Для комментария нужен только id задачи, страница и список комментариев не строятся
+    task = get_object_or_404(Task.objects.only('id'), pk=pk)
+    comment_form = CommentForm(request.POST)
+    if not comment_form.is_valid():
+        return render(request, 'includes/comment_form.html', {'task': task, 'comment_form': comment_form}, status=400)
+    comment = comment_form.save(commit=False)
+    comment.task = task
+    comment.author = request.user
+    comment.save()
+    return render(request, 'includes/comment.html', {'comment': comment}, status=201)
+
 @login_required
 def task_detail(request, pk):
-    task = get_object_or_404(Task, pk=pk)
-    comments = task.comments.all()
+    if request.method == 'POST' and _is_partial(request):
+        return _post_comment_fragment(request, pk)
+    
+    task = get_object_or_404(Task.objects.select_related('project', 'assigned_to', 'created_by'), pk=pk)
+    comments = task.comments.select_related('author')
     
     if request.method == 'POST':
         comment_form = CommentForm(request.POST)
@@ -161,10 +350,13 @@ def task_delete(request, pk):
 def task_complete(request, pk):
     task = get_object_or_404(Task, pk=pk)
     
-    if request.user.userprofile.is_user() and task.assigned_to != request.user:
+    if get_role(request).is_user and task.assigned_to_id != request.user.id:
         return HttpResponseForbidden("Вы не можете завершить эту задачу")
     
     task.status = 'done'
     task.save()
+    if _is_partial(request):
+        # Только обновленный бейдж статуса
+        return render(request, 'includes/task_status.html', {'task': task})
     messages.success(request, 'Задача отмечена как выполненная!')
-    return redirect('task_detail', pk=task.pk)
\ No newline at end of file
+    return redirect('task_detail', pk=task.pk)